@@ -0,0 +1,75 @@
+"""
+Bounded worker pool for the per-dataset statistics on the analysis page.
+
+Each selected dataset becomes a job that runs on a process-wide thread pool of
+MAX_WORKERS threads. Every session gets at most PER_SESSION jobs in flight at a
+time, so one user picking every dataset cannot take the whole pool. The caller
+consumes events as jobs progress, in the order they happen, and renders them
+in the Streamlit script thread (worker threads must not touch st.*). A job that
+raises produces an 'error' event for itself only; the others keep running.
+
+    for name, kind, value in analysis_pool.get_pool().run(jobs):
+        ...  # kind is 'partial' (a value the job reported), 'done' (its result) or 'error' (the exception)
+"""
+import collections
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.environ.get('GEOAPP_ANALYSIS_WORKERS', 8))
+PER_SESSION = int(os.environ.get('GEOAPP_ANALYSIS_PER_SESSION', 3))
+
+
+class AnalysisPool:
+
+    def __init__(self, max_workers=MAX_WORKERS, per_session=PER_SESSION):
+        self.per_session = per_session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+
+    def run(self, jobs, limit=None):
+        """
+        run jobs ({name: job(report) -> result}, report(value) publishing a partial
+        value) with at most `limit` in flight, yielding (name, kind, value) events
+        """
+        limit = max(1, limit or self.per_session)
+        events = queue.Queue()
+        waiting = collections.deque(jobs.items())
+
+        def submit():
+            name, job = waiting.popleft()
+
+            def task():
+                try:
+                    result = job(lambda value: events.put((name, 'partial', value)))
+                except Exception as e:
+                    events.put((name, 'error', e))
+                else:
+                    events.put((name, 'done', result))
+            self._executor.submit(task)
+
+        running = 0
+        while waiting and running < limit:
+            submit()
+            running += 1
+        while running:
+            name, kind, value = events.get()
+            if kind != 'partial':
+                running -= 1
+                if waiting:
+                    submit()
+                    running += 1
+            yield name, kind, value
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """the process-wide pool, shared by every session"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AnalysisPool()
+        return _pool
@@ -0,0 +1,57 @@
+"""
+Area-weighted apportionment of subdistrict counts onto other polygon sets.
+
+Constituencies do not nest in the admin hierarchy, so their counts are
+estimated by splitting each subdistrict's count across the constituencies it
+overlaps, in proportion to the overlapping area. The overlay is computed once,
+vectorized over all intersecting pairs, and kept as a sparse
+(target x subdistrict) weight matrix; after that every topic is a single
+sparse matrix-vector product.
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import shapely
+
+# Asia South Albers Equal Area Conic: areas in m2 that are comparable across India
+EQUAL_AREA_CRS = 'ESRI:102028'
+
+
+def overlay_weights(source, target, equal_area_crs=EQUAL_AREA_CRS):
+    """
+    source, target: GeoDataFrames; returns a sparse matrix W (len(target) x len(source))
+    with W[j, i] the share of source polygon i's area that falls in target polygon j
+    """
+    src = shapely.make_valid(np.asarray(source.to_crs(equal_area_crs).geometry.values))
+    tgt = shapely.make_valid(np.asarray(target.to_crs(equal_area_crs).geometry.values))
+
+    # every candidate (target, source) pair in one bulk STRtree query, then exact areas
+    tgt_idx, src_idx = shapely.STRtree(src).query(tgt, predicate='intersects')
+    shared = shapely.area(shapely.intersection(src[src_idx], tgt[tgt_idx]))
+    src_area = shapely.area(src)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(src_area[src_idx] > 0, shared / src_area[src_idx], 0.0)
+
+    keep = weights > 0
+    return scipy.sparse.csr_matrix(
+        (weights[keep], (tgt_idx[keep], src_idx[keep])),
+        shape=(len(tgt), len(src)),
+    )
+
+
+def weights_to_frame(weights):
+    """COO triplets, for storing the matrix as a table"""
+    coo = weights.tocoo()
+    return pd.DataFrame({'target': coo.row.astype(np.int32), 'source': coo.col.astype(np.int32), 'weight': coo.data})
+
+
+def weights_from_frame(frame, shape):
+    return scipy.sparse.csr_matrix(
+        (frame['weight'].to_numpy(), (frame['target'].to_numpy(), frame['source'].to_numpy())),
+        shape=shape,
+    )
+
+
+def apportion(weights, source_counts):
+    """counts per target polygon; missing source counts count as zero"""
+    return weights @ np.nan_to_num(np.asarray(source_counts, dtype=np.float64))
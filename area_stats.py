@@ -0,0 +1,107 @@
+"""
+Persistent water area statistics for the analysis page.
+
+Monthly areas are stored one row per (dataset, ROI hash, month, scale) in a
+SQLite file next to the result cache. A query for a date range only asks Earth
+Engine for the months that are not stored yet. Widening the year range
+computes the new months only, and changing the reducer is answered without any
+request, because the yearly reduction runs on the stored monthly values. A
+month that Earth Engine has no image for is stored as NULL, so it is not asked
+for again.
+
+The per-class tables of the static datasets (image_area_by_group) do not
+depend on dates. They are kept in the result cache, keyed on the layer and ROI
+expressions and the scale.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from result_cache import CACHE_DIR, cache
+from sqlite_store import SQLiteStore
+
+STATS_PATH = os.environ.get('GEOAPP_AREA_STATS', os.path.join(CACHE_DIR, 'area_stats.sqlite'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS monthly_area (
+    dataset TEXT NOT NULL,
+    roi TEXT NOT NULL,
+    month TEXT NOT NULL,
+    scale REAL NOT NULL,
+    area REAL,
+    computed REAL NOT NULL,
+    PRIMARY KEY (dataset, roi, scale, month)
+);
+"""
+
+
+def roi_hash(region):
+    """stable id of an ROI: its serialized Earth Engine expression (None for no ROI)"""
+    if region is None:
+        return 'none'
+    return hashlib.sha256(region.serialize().encode()).hexdigest()[:32]
+
+
+class AreaStats(SQLiteStore):
+
+    def __init__(self, path=STATS_PATH):
+        super().__init__(path, _SCHEMA)
+
+    def monthly(self, dataset, roi, scale, months):
+        """{month: area or None} for the stored months among `months`"""
+        con = self._connect()
+        stored = {}
+        months = list(months)
+        # stay under SQLite's bound parameter limit
+        for start in range(0, len(months), 500):
+            part = months[start:start + 500]
+            stored.update(con.execute(
+                f"SELECT month, area FROM monthly_area WHERE dataset = ? AND roi = ? AND scale = ? "
+                f"AND month IN ({', '.join('?' * len(part))})",
+                [dataset, roi, float(scale)] + part,
+            ).fetchall())
+        return stored
+
+    def put_monthly(self, dataset, roi, scale, areas):
+        """store {month: area or None}"""
+        now = time.time()
+        with self._transaction() as con:
+            con.executemany(
+                'INSERT OR REPLACE INTO monthly_area VALUES (?, ?, ?, ?, ?, ?)',
+                [(dataset, roi, month, float(scale), area, now) for month, area in areas.items()],
+            )
+
+    def stats(self):
+        con = self._connect()
+        rows, series = con.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT dataset || roi || scale) FROM monthly_area'
+        ).fetchone()
+        return {'months': rows, 'series': series}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """the process-wide store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AreaStats()
+        return _store
+
+
+@cache.memoize(name='geemap.image_area_by_group')
+def image_area_by_group(layer, region, scale):
+    """geemap.image_area_by_group in hectares, kept until evicted (the layers do not change)"""
+    import geemap.foliumap as geemap
+    return geemap.image_area_by_group(
+        layer,
+        region=region,
+        scale=scale,
+        denominator=1e4,
+        decimal_places=2,
+        verbose=True,
+    )
@@ -0,0 +1,66 @@
+"""
+Benchmark the boundary geometry decode path on a local parquet fixture.
+
+    python benchmarks/bench_ingest.py --rows 6000 --vertices 256
+
+The fixture is written once to benchmarks/fixtures/ in the same layout BigQuery
+returns (attributes + WKB column) and then read back through geo_ingest, so the
+numbers match the production decode path without network access.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+import pyarrow.parquet as pq
+import shapely
+from shapely import wkt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import geo_ingest  # noqa: E402
+from synthetic import make_boundary_frame  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_path(rows, vertices):
+    path = os.path.join(FIXTURE_DIR, f"boundaries_{rows}x{vertices}.parquet")
+    if not os.path.exists(path):
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        geo_ingest.write_fixture(make_boundary_frame(rows, vertices=vertices), path)
+    return path
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:>10.1f} ms {peak / 2**20:>10.1f} MiB peak")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=6000)
+    parser.add_argument('--vertices', type=int, default=256)
+    args = parser.parse_args()
+
+    path = fixture_path(args.rows, args.vertices)
+    table = pq.read_table(path, memory_map=True)
+    # the old path: WKT strings parsed one row at a time
+    text = pd.Series(shapely.to_wkt(geo_ingest.decode_geometry(table.column(geo_ingest.GEOMETRY_COLUMN))))
+
+    print(f"{args.rows} rows x {args.vertices} vertices")
+    measure("wkt.loads via Series.apply", lambda: text.apply(wkt.loads))
+    measure("vectorized from_wkb", lambda: geo_ingest.decode_geometry(table.column(geo_ingest.GEOMETRY_COLUMN)))
+    measure("read_fixture (end to end)", lambda: geo_ingest.read_fixture(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Payload size and render time per level of detail.
+
+    python benchmarks/bench_lod.py --rows 6000 --vertices 256
+
+For every LOD of a synthetic subdistrict coverage this reports the number of
+vertices, the GeoJSON payload m.add_gdf would ship, the time to serialize it,
+and (when leafmap is installed) the time to build the Kepler map HTML.
+"""
+import argparse
+import os
+import sys
+import time
+
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import lod  # noqa: E402
+from synthetic import make_boundary_frame  # noqa: E402
+
+
+def render_time(gdf):
+    try:
+        import leafmap.kepler as leafmap
+    except ImportError:
+        return None
+    start = time.perf_counter()
+    m = leafmap.Map()
+    m.add_gdf(gdf, layer_name='bench')
+    m._repr_html_()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=6000)
+    parser.add_argument('--vertices', type=int, default=256)
+    args = parser.parse_args()
+
+    gdf = make_boundary_frame(args.rows, vertices=args.vertices)
+
+    start = time.perf_counter()
+    pyramid = lod.build_pyramid(gdf.geometry.values)
+    print(f"built {len(pyramid)} LODs for {args.rows} polygons in {time.perf_counter() - start:.2f} s")
+
+    zooms = {i: [z for z in range(0, 15) if lod.pick_lod(z) == i] for i in range(len(pyramid))}
+    print(f"{'lod':>3} {'tolerance':>10} {'zooms':>8} {'vertices':>10} {'geojson MiB':>12} {'to_json ms':>11} {'render ms':>10}")
+    for i, (tolerance, geometry) in enumerate(zip(lod.TOLERANCES, pyramid)):
+        frame = gdf.assign(geometry=geometry)
+        start = time.perf_counter()
+        payload = frame.to_json()
+        serialize = time.perf_counter() - start
+        render = render_time(frame)
+        z = zooms[i]
+        print(
+            f"{i:>3} {tolerance:>10.4f} {f'{z[0]}-{z[-1]}' if z else '-':>8} "
+            f"{int(shapely.get_num_coordinates(geometry).sum()):>10} {len(payload) / 2**20:>12.2f} "
+            f"{serialize * 1000:>11.1f} {'n/a' if render is None else f'{render * 1000:.1f}':>10}"
+        )
+
+
+if __name__ == '__main__':
+    main()
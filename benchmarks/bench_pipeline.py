@@ -0,0 +1,160 @@
+"""
+End-to-end benchmark of the admin choropleth pipeline, stage by stage.
+
+    python benchmarks/bench_pipeline.py --subdistricts 6000 --vertices 128 --compare
+
+A synthetic India-sized hierarchy (country / states / districts / ~6,000
+subdistricts, dissolved so the levels nest), two constituency coverages and an
+enriched counts table are written once to benchmarks/fixtures/ in the layout
+BigQuery returns. For every level the script then times the stages the app
+runs:
+
+    fetch -> parse -> register -> groupby (apportion for constituencies)
+          -> lod -> merge -> add_gdf
+
+with peak memory per stage, and appends the run to benchmarks/history.jsonl
+with the commit hash (see harness.py). --compare prints the change against the
+latest run with the same parameters on another commit.
+"""
+import argparse
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import apportion  # noqa: E402
+import compact  # noqa: E402
+import duck_engine  # noqa: E402
+import geo_ingest  # noqa: E402
+import lod  # noqa: E402
+import rollup  # noqa: E402
+import harness  # noqa: E402
+from synthetic import TOPICS, make_boundary_frame, make_enriched_counts, make_hierarchy  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+LEVEL_KEYS = {level: [columns[0]] for level, (_, columns) in geo_ingest.BOUNDARY_TABLES.items()}
+CONSTITUENCIES = {'Parlamentary Constituencies': 543, 'Assembly Consituencies': 4120}
+
+
+###############################################
+## FIXTURES
+###############################################
+
+def fixture_paths(args):
+    tag = f"{args.subdistricts}x{args.vertices}_s{args.seed}"
+    paths = {level: os.path.join(FIXTURE_DIR, f"pipeline_{tag}_{level.replace(' ', '_')}.parquet")
+             for level in geo_ingest.BOUNDARY_TABLES}
+    paths['enriched'] = os.path.join(FIXTURE_DIR, f"pipeline_{tag}_enriched.parquet")
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    frames = make_hierarchy(args.subdistricts, args.districts, args.states, args.vertices, args.seed)
+    for i, (level, rows) in enumerate(CONSTITUENCIES.items()):
+        code, name = geo_ingest.BOUNDARY_TABLES[level][1]
+        frames[level] = make_boundary_frame(rows, code, name, args.vertices, args.seed + 1 + i)
+    for level, frame in frames.items():
+        geo_ingest.write_fixture(frame[geo_ingest.BOUNDARY_TABLES[level][1] + ['geometry']], paths[level])
+    enriched = make_enriched_counts(frames['Subdistricts'], seed=args.seed)
+    pq.write_table(pa.Table.from_pandas(enriched, preserve_index=False), paths['enriched'])
+    return paths
+
+
+def render(gdf, level):
+    """what m.add_gdf costs: the Kepler map HTML when leafmap is installed, else the GeoJSON it embeds"""
+    try:
+        import leafmap.kepler as leafmap
+    except ImportError:
+        return 'to_json', lambda: gdf.to_json()
+
+    def kepler():
+        m = leafmap.Map()
+        m.add_gdf(gdf, layer_name=level)
+        return m._repr_html_()
+    return 'kepler', kepler
+
+
+###############################################
+## PIPELINE
+###############################################
+
+def run(args):
+    paths = fixture_paths(args)
+    results = []
+
+    def stage(level, name, func, **extra):
+        value, stats = harness.measure(func, args.repeat)
+        results.append({'level': level, 'stage': name, **stats, **extra})
+        print(f"{level:>28} {name:>10} {stats['seconds'] * 1000:>10.1f} {stats['python_peak_bytes'] / 2**20:>10.1f} "
+              f"{stats['arrow_peak_bytes'] / 2**20:>10.1f} {stats['rss_peak_bytes'] / 2**20:>10.1f}")
+        return value
+
+    print(f"{'level':>28} {'stage':>10} {'ms':>10} {'py MiB':>10} {'arrow MiB':>10} {'rss MiB':>10}")
+    enriched = stage('enriched', 'fetch', lambda: pq.read_table(paths['enriched'], memory_map=True))
+    compacted = stage('enriched', 'compact', lambda: compact.compact_enriched(enriched.to_pandas()))
+    stage('enriched', 'register', lambda: duck_engine.register_arrow(
+        'allcounts', pa.Table.from_pandas(compacted, preserve_index=False)))
+
+    subdistricts = subdistrict_counts = None
+    for level in args.levels:
+        table = stage(level, 'fetch', lambda: pq.read_table(paths[level], memory_map=True))
+        gdf = stage(level, 'parse', lambda: geo_ingest.arrow_to_gdf(table))
+        stage(level, 'register', lambda: duck_engine.register_arrow(
+            level, duck_engine.with_row_numbers(table.drop([geo_ingest.GEOMETRY_COLUMN]))))
+
+        if level in CONSTITUENCIES:
+            if subdistricts is None:
+                subdistricts = geo_ingest.arrow_to_gdf(pq.read_table(paths['Subdistricts'], memory_map=True))
+                duck_engine.register_arrow('Subdistricts', duck_engine.with_row_numbers(
+                    pq.read_table(paths['Subdistricts'], columns=LEVEL_KEYS['Subdistricts'])))
+                subdistrict_counts = rollup.build_rollup_cube_duckdb(['Subdistricts'], LEVEL_KEYS, TOPICS)
+            weights = stage(level, 'weights', lambda: apportion.overlay_weights(subdistricts, gdf))
+            counts = stage(level, 'apportion', lambda: apportion.apportion(
+                weights, subdistrict_counts.counts('Subdistricts', args.topic)))
+        else:
+            cube = stage(level, 'groupby', lambda: rollup.build_rollup_cube_duckdb([level], LEVEL_KEYS, TOPICS))
+            counts = cube.counts(level, args.topic)
+
+        pyramid = stage(level, 'lod', lambda: lod.build_pyramid(gdf.geometry.values))
+        outdf = stage(level, 'merge', lambda: gdf.assign(geometry=pyramid[lod.pick_lod(args.zoom)], cnt=counts))
+        renderer, draw = render(outdf, level)
+        stage(level, 'add_gdf', draw, renderer=renderer)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subdistricts', type=int, default=6000)
+    parser.add_argument('--districts', type=int, default=750)
+    parser.add_argument('--states', type=int, default=36)
+    parser.add_argument('--vertices', type=int, default=128)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--levels', nargs='+', default=list(geo_ingest.BOUNDARY_TABLES), choices=list(geo_ingest.BOUNDARY_TABLES))
+    parser.add_argument('--topic', default=TOPICS[0], choices=TOPICS)
+    parser.add_argument('--zoom', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--history', default=harness.HISTORY_PATH)
+    parser.add_argument('--no-history', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    params = {k: getattr(args, k) for k in ('subdistricts', 'districts', 'states', 'vertices', 'seed', 'levels', 'topic', 'zoom')}
+    record = dict(harness.run_info('pipeline', params), results=run(args))
+
+    if args.compare:
+        baseline = harness.previous_run(record, args.history)
+        if baseline is None:
+            print("no earlier run with these parameters on another commit")
+        else:
+            print(f"\nagainst {baseline['commit'][:10]} ({baseline['timestamp']})")
+            for level, name, before, after, ratio in harness.compare(record, baseline):
+                print(f"{level:>28} {name:>10} {before * 1000:>10.1f} -> {after * 1000:>10.1f} ms  x{ratio:.2f}")
+    if not args.no_history:
+        harness.append_history(record, args.history)
+
+
+if __name__ == '__main__':
+    main()
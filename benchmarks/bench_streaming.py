@@ -0,0 +1,149 @@
+"""
+Peak memory of the streamed enriched-table ingest versus the materialized one.
+
+    python benchmarks/bench_streaming.py --rows 100000 400000 1600000 --batch 50000
+
+Fake BigQuery record batches (string admin codes, int64 counts) come from a
+FakeClient standing in for bigquery.Client and go through
+geo_ingest.stream_table, compact.compact_batch and SnapshotStore.write_batches,
+as the app's ingest does. The materialized path builds the whole table,
+converts it to pandas and compacts it, like the old read_gbq ingest. Peak Arrow
+memory is sampled after every batch; Python/numpy memory comes from tracemalloc.
+With streaming, both stay flat as the table grows.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import compact  # noqa: E402
+import geo_ingest  # noqa: E402
+import snapshot_store  # noqa: E402
+
+COUNT_COLUMNS = ['roads', 'habitations', 'facilities', 'proposals', 'buildings', 'osm_pois']
+
+
+def fake_batches(rows, batch_rows, seed=0):
+    """enriched-table-like record batches, generated lazily"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, batch_rows):
+        n = min(batch_rows, rows - start)
+        taluk = rng.integers(0, 6000, n)
+        columns = {
+            'country_code': pa.array(np.full(n, 'IN', dtype=object)),
+            'state_code': pa.array((taluk // 200).astype(str).astype(object)),
+            'district_code': pa.array((taluk // 8).astype(str).astype(object)),
+            'taluk_code': pa.array(taluk.astype(str).astype(object)),
+        }
+        for column in COUNT_COLUMNS:
+            columns[column] = pa.array(rng.integers(0, 5000, n, dtype=np.int64))
+        yield pa.RecordBatch.from_pydict(columns)
+
+
+class FakeRows:
+    """the part of bigquery's RowIterator that geo_ingest.query_batches uses"""
+
+    def __init__(self, rows, batch_rows, seed):
+        self.total_rows = rows
+        self.batch_rows = batch_rows
+        self.seed = seed
+
+    def to_arrow_iterable(self, bqstorage_client=None):
+        return fake_batches(self.total_rows, self.batch_rows, self.seed)
+
+    def to_arrow(self, create_bqstorage_client=True):
+        schema = next(fake_batches(1, 1)).schema
+        return pa.Table.from_batches(list(self.to_arrow_iterable()), schema=schema)
+
+
+class FakeClient:
+    """stands in for bigquery.Client: every query returns `rows` enriched-table-like rows"""
+
+    def __init__(self, rows, batch_rows, seed=0):
+        self.rows = rows
+        self.batch_rows = batch_rows
+        self.seed = seed
+        self.queries = []
+
+    def query(self, sql):
+        self.queries.append(sql)
+        return self
+
+    def result(self, page_size=None):
+        return FakeRows(self.rows, self.batch_rows, self.seed)
+
+
+class ArrowPeak:
+    """high-water mark of pyarrow's allocations, sampled between batches"""
+
+    def __init__(self):
+        self.base = pa.total_allocated_bytes()
+        self.peak = 0
+
+    def sample(self):
+        self.peak = max(self.peak, pa.total_allocated_bytes() - self.base)
+
+    def watch(self, batches):
+        for batch in batches:
+            self.sample()
+            yield batch
+            self.sample()
+
+
+def streamed(store, rows, batch_rows, types):
+    arrow = ArrowPeak()
+    geo_ingest.stream_table(
+        FakeClient(rows, batch_rows), 'SELECT * FROM enriched', store, 'bench', 'streamed',
+        transform=lambda batch: compact.compact_batch(batch, types), progress=lambda done, total: arrow.sample(),
+    )
+    return arrow.peak
+
+
+def materialized(store, rows, batch_rows):
+    arrow = ArrowPeak()
+    table = pa.Table.from_batches(list(arrow.watch(fake_batches(rows, batch_rows))))
+    arrow.sample()
+    frame = compact.compact_enriched(table.to_pandas())
+    arrow.sample()
+    del table
+    store.write('bench', 'materialized', frame)
+    return arrow.peak
+
+
+def measure(run, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    arrow_peak = run(*args)
+    elapsed = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, arrow_peak, python_peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 400_000, 1_600_000])
+    parser.add_argument('--batch', type=int, default=50_000)
+    args = parser.parse_args()
+
+    types = compact.count_types({f"{c}__{b}": v for c in COUNT_COLUMNS for b, v in (('min', 0), ('max', 4999))},
+                                COUNT_COLUMNS)
+    print(f"{'rows':>10} {'path':>13} {'seconds':>8} {'arrow peak MiB':>15} {'python peak MiB':>16}")
+    with tempfile.TemporaryDirectory() as root:
+        store = snapshot_store.SnapshotStore(root)
+        for rows in args.rows:
+            for label, run, extra in (('streamed', streamed, (types,)), ('materialized', materialized, ())):
+                elapsed, arrow_peak, python_peak = measure(run, store, rows, args.batch, *extra)
+                print(f"{rows:>10} {label:>13} {elapsed:>8.2f} {arrow_peak / 2**20:>15.1f} {python_peak / 2**20:>16.1f}")
+    print(f"arrow pool high-water mark over the run: {pa.default_memory_pool().max_memory() / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
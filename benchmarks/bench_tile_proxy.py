@@ -0,0 +1,122 @@
+"""
+Latency and upstream traffic of the caching tile proxy against a fake upstream.
+
+    python benchmarks/bench_tile_proxy.py --viewers 8 --max-zoom 3 --latency 150
+
+A local XYZ server stands in for Earth Engine: it answers every tile with a
+small PNG after --latency ms and counts the requests it receives. A
+tile_proxy.TileProxy with a temporary MBTiles store is served on a free port.
+--viewers concurrent clients then load every tile up to --max-zoom through it,
+twice. The cold pass should reach upstream once per tile however many viewers
+ask. The warm pass should not reach it at all. A last run with a store
+budget of a few tiles checks that LRU eviction keeps the file within budget.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tile_proxy  # noqa: E402
+
+
+def png(z, x, y, size=256):
+    """a valid single-colour PNG, different per tile"""
+    def chunk(kind, data):
+        return len(data).to_bytes(4, 'big') + kind + data + zlib.crc32(kind + data).to_bytes(4, 'big')
+    row = b'\x00' + bytes([z * 30 % 256, x * 17 % 256, y * 11 % 256]) * size
+    header = size.to_bytes(4, 'big') * 2 + b'\x08\x02\x00\x00\x00'
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(row * size)) + chunk(b'IEND', b'')
+
+
+def fake_upstream(latency):
+    """an XYZ server on a free port; returns (server, URL template, request counter)"""
+    counter = {'requests': 0}
+    lock = threading.Lock()
+
+    class Upstream(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            with lock:
+                counter['requests'] += 1
+            z, x, y = (int(part) for part in self.path.strip('/').split('/')[-3:])
+            time.sleep(latency)
+            data = png(z, x, y)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}", counter
+
+
+def load_all(base, layer, tiles, viewers):
+    """every viewer requests every tile; returns per-request latencies in seconds"""
+    def get(tile):
+        start = time.perf_counter()
+        with urllib.request.urlopen(f"{base}/tiles/{layer}/{tile[0]}/{tile[1]}/{tile[2]}") as response:
+            response.read()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=viewers * 4) as executor:
+        return np.array(list(executor.map(get, [t for _ in range(viewers) for t in tiles])))
+
+
+def run(args):
+    upstream, template, counter = fake_upstream(args.latency / 1000)
+    tiles = list(tile_proxy.tiles_up_to(args.max_zoom))
+    with tempfile.TemporaryDirectory() as tmp:
+        store = tile_proxy.TileStore(os.path.join(tmp, 'tiles.mbtiles'), max_bytes=args.max_bytes)
+        proxy = tile_proxy.TileProxy(store)
+        proxy.register('bench', lambda: template)
+        server = tile_proxy.serve(proxy, port=0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        print(f"{len(tiles)} tiles x {args.viewers} viewers, upstream latency {args.latency} ms")
+        print(f"{'pass':>6} {'upstream':>9} {'p50 ms':>8} {'p95 ms':>8} {'wall s':>8}")
+        for name in ('cold', 'warm'):
+            before, start = counter['requests'], time.perf_counter()
+            latencies = load_all(base, 'bench', tiles, args.viewers)
+            print(f"{name:>6} {counter['requests'] - before:>9} {np.percentile(latencies, 50) * 1000:>8.1f} "
+                  f"{np.percentile(latencies, 95) * 1000:>8.1f} {time.perf_counter() - start:>8.2f}")
+        print(store.stats())
+        server.shutdown()
+
+        # a budget of a few tiles: the store keeps only the most recently served ones
+        small = tile_proxy.TileStore(os.path.join(tmp, 'small.mbtiles'), max_bytes=4 * len(png(args.max_zoom, 1, 1)))
+        small_proxy = tile_proxy.TileProxy(small)
+        small_proxy.register('bench', lambda: template)
+        fetched, failed = tile_proxy.prefetch(small_proxy, 'bench', args.max_zoom)
+        stats = small.stats()
+        print(f"small budget: {fetched} fetched, {stats['tiles']} kept, {stats['evictions']} evicted, "
+              f"{stats['bytes']} <= {stats['max_bytes']} bytes")
+    upstream.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--viewers', type=int, default=8)
+    parser.add_argument('--max-zoom', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=150, help='upstream latency per tile, ms')
+    parser.add_argument('--max-bytes', type=int, default=tile_proxy.MAX_BYTES)
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+GeoJSON versus quantized TopoJSON payload per boundary level.
+
+    python benchmarks/bench_topojson.py --vertices 256
+
+Each level is a synthetic coverage with the row count of the real table. For
+each one this reports the bytes that would be shipped to the browser, raw and
+gzipped, the encode time, and json.loads time as a stand-in for the browser's
+parse cost.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import topo_encode  # noqa: E402
+from synthetic import make_boundary_frame  # noqa: E402
+
+LEVELS = {
+    'Country': (1, 'country_code', 'country_name'),
+    'States': (36, 'state_code', 'state_name'),
+    'Districts': (750, 'district_code', 'district_name'),
+    'Subdistricts': (6000, 'taluk_code', 'taluk_name'),
+}
+
+
+def parse_time(text):
+    start = time.perf_counter()
+    json.loads(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vertices', type=int, default=256)
+    parser.add_argument('--quantization', type=int, default=topo_encode.QUANTIZATION)
+    args = parser.parse_args()
+
+    print(f"{'level':>13} {'rows':>6} {'geojson MiB':>12} {'topojson MiB':>13} {'gzip MiB':>15} "
+          f"{'ratio':>6} {'encode s':>9} {'parse ms':>15}")
+    for level, (rows, code, name) in LEVELS.items():
+        gdf = make_boundary_frame(rows, code, name, vertices=args.vertices)
+        geojson = gdf.to_json()
+        start = time.perf_counter()
+        topo = topo_encode.topology(gdf.geometry.values, args.quantization)
+        topojson = topo_encode.to_json(topo_encode.with_properties(topo, gdf.drop(columns='geometry')))
+        encode = time.perf_counter() - start
+        sizes = topo_encode.payload_sizes(gdf, args.quantization)
+        print(
+            f"{level:>13} {rows:>6} {len(geojson) / 2**20:>12.2f} {len(topojson) / 2**20:>13.2f} "
+            f"{sizes['geojson gzip bytes'] / 2**20:>7.2f}/{sizes['topojson gzip bytes'] / 2**20:<7.2f} "
+            f"{len(geojson) / len(topojson):>6.1f} {encode:>9.2f} "
+            f"{parse_time(geojson) * 1000:>7.0f}/{parse_time(topojson) * 1000:<7.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
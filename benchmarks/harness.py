@@ -0,0 +1,137 @@
+"""
+Timing, peak memory and result history shared by the benchmark scripts.
+
+Timings are the best of several untraced runs. Memory comes from one extra run
+with tracemalloc on (Python and numpy allocations), while a sampler thread
+polls pyarrow's allocator and the process RSS (GEOS and DuckDB allocate
+outside both).
+
+Every run is appended to a JSON-lines history together with the commit it
+was measured on, so results can be compared across commits:
+
+    python benchmarks/bench_pipeline.py --compare
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import pyarrow as pa
+
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), 'history.jsonl')
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+class _Sampler:
+    """polls arrow allocations and RSS in the background, keeping the maxima above the start value"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.arrow_base, self.rss_base = pa.total_allocated_bytes(), _rss()
+        self.arrow_peak = self.rss_peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.arrow_peak = max(self.arrow_peak, pa.total_allocated_bytes() - self.arrow_base)
+        self.rss_peak = max(self.rss_peak, _rss() - self.rss_base)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def measure(func, repeat=3):
+    """(result, {'seconds', 'python_peak_bytes', 'arrow_peak_bytes', 'rss_peak_bytes'}) for func()"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    with _Sampler() as sampler:
+        result = func()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {
+        'seconds': best,
+        'python_peak_bytes': python_peak,
+        'arrow_peak_bytes': sampler.arrow_peak,
+        'rss_peak_bytes': sampler.rss_peak,
+    }
+
+
+###############################################
+## HISTORY
+###############################################
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_info(benchmark, params):
+    return {
+        'benchmark': benchmark,
+        'params': params,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def append_history(record, path=HISTORY_PATH):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def read_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_run(record, path=HISTORY_PATH):
+    """latest earlier run of the same benchmark and parameters on a different commit"""
+    for old in reversed(read_history(path)):
+        if (old['benchmark'], old['params']) == (record['benchmark'], record['params']) and old['commit'] != record['commit']:
+            return old
+    return None
+
+
+def compare(record, baseline, keys=('level', 'stage')):
+    """rows of (key..., seconds before, seconds after, ratio) for results present in both runs"""
+    before = {tuple(r[k] for k in keys): r for r in baseline['results']}
+    rows = []
+    for r in record['results']:
+        old = before.get(tuple(r[k] for k in keys))
+        if old is not None:
+            rows.append((*(r[k] for k in keys), old['seconds'], r['seconds'], r['seconds'] / old['seconds'] if old['seconds'] else float('nan')))
+    return rows
@@ -0,0 +1,124 @@
+"""
+Synthetic admin boundaries for offline benchmarks.
+
+Units are Voronoi cells over India's bounding box, densified and pushed through
+a deterministic wiggle field. Because the displacement depends only on the
+coordinates, neighbouring cells keep identical shared borders, so the result
+is a proper polygon coverage like the real boundary tables.
+"""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+BOUNDS = (68.0, 8.0, 97.0, 37.0)
+
+
+def _wiggle(coords, cell_size):
+    # small enough slopes that no ring folds over itself
+    x, y = coords[:, 0], coords[:, 1]
+    f1, f2 = 2 * np.pi * 8 / cell_size, 2 * np.pi * 21 / cell_size
+    amplitude = 0.004 * cell_size
+    dx = amplitude * (np.sin(f1 * y) + 0.5 * np.sin(f2 * y + x))
+    dy = amplitude * (np.sin(f1 * x) + 0.5 * np.sin(f2 * x + y))
+    return np.column_stack([x + dx, y + dy])
+
+
+def make_polygons(n, vertices=256, seed=0):
+    """n polygons forming a coverage of BOUNDS, with roughly `vertices` vertices each"""
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = BOUNDS
+    points = shapely.multipoints(np.column_stack([rng.uniform(xmin, xmax, n), rng.uniform(ymin, ymax, n)]))
+    box = shapely.box(*BOUNDS)
+    cells = shapely.get_parts(shapely.voronoi_polygons(points, extend_to=box))
+    cells = shapely.intersection(cells, box)
+
+    # densify so every cell has about `vertices` vertices, then wiggle the borders
+    cell_size = np.sqrt((xmax - xmin) * (ymax - ymin) / n)
+    cells = shapely.segmentize(cells, 4 * cell_size / vertices)
+    cells = shapely.transform(cells, lambda c: _wiggle(c, cell_size))
+    return cells[:n]
+
+
+def make_boundary_frame(n, code='taluk_code', name='taluk_name', vertices=256, seed=0):
+    """a GeoDataFrame shaped like one of the geoprocessed boundary tables"""
+    codes = [f"{i:06d}" for i in range(n)]
+    return gpd.GeoDataFrame(
+        {code: codes, name: [f"unit {c}" for c in codes]},
+        geometry=make_polygons(n, vertices, seed),
+        crs="EPSG:4326",
+    )
+
+
+###############################################
+## ADMIN HIERARCHY + ENRICHED TABLE
+###############################################
+
+TOPICS = ['roadcnt', 'habcnt', 'faccnt', 'propcnt', 'bldngcnt', 'osmpoicnt']
+
+
+def _group(points, n_groups, rng):
+    # every unit joins the nearest of n_groups seed units, so groups are contiguous and never empty
+    from scipy.spatial import cKDTree
+    seeds = rng.choice(len(points), size=n_groups, replace=False)
+    return cKDTree(points[seeds]).query(points)[1]
+
+
+def _dissolve(geometry, groups, n_groups):
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(n_groups + 1))
+    return np.array([shapely.union_all(geometry[order[a:b]]) for a, b in zip(bounds[:-1], bounds[1:])])
+
+
+def _centroids(geometry):
+    return shapely.get_coordinates(shapely.centroid(geometry))
+
+
+def make_hierarchy(subdistricts=6000, districts=750, states=36, vertices=256, seed=0):
+    """
+    country / state / district / subdistrict frames shaped like the geoprocessed
+    tables; districts and states are dissolved from the units below, so they nest
+    """
+    rng = np.random.default_rng(seed)
+    taluks = make_polygons(subdistricts, vertices, seed)
+    district_of_taluk = _group(_centroids(taluks), districts, rng)
+    district_geometry = _dissolve(taluks, district_of_taluk, districts)
+    state_of_district = _group(_centroids(district_geometry), states, rng)
+    state_geometry = _dissolve(district_geometry, state_of_district, states)
+
+    def frame(code, name, codes, geometry, **parents):
+        return gpd.GeoDataFrame(
+            {code: codes, name: [f"unit {c}" for c in codes], **parents}, geometry=geometry, crs="EPSG:4326"
+        )
+
+    state_codes = np.array([f"{i:02d}" for i in range(states)])
+    district_codes = np.array([f"{state_codes[s]}{i:04d}" for i, s in enumerate(state_of_district)])
+    taluk_codes = np.array([f"{district_codes[d]}{i:05d}" for i, d in enumerate(district_of_taluk)])
+    return {
+        'Country': frame('country_code', 'country_name', ['IN'], [shapely.union_all(state_geometry)]),
+        'States': frame('state_code', 'state_name', state_codes, state_geometry),
+        'Districts': frame('district_code', 'district_name', district_codes, district_geometry),
+        'Subdistricts': frame(
+            'taluk_code', 'taluk_name', taluk_codes, taluks,
+            district_code=district_codes[district_of_taluk],
+            state_code=state_codes[state_of_district[district_of_taluk]],
+        ),
+    }
+
+
+def make_enriched_counts(subdistricts, topics=TOPICS, missing=0.02, seed=0):
+    """
+    the enriched subdistrict table: admin codes plus skewed integer counts per
+    topic; a `missing` share of subdistricts has no row, as in the real data
+    """
+    rng = np.random.default_rng(seed)
+    rows = subdistricts[rng.random(len(subdistricts)) >= missing]
+    data = {
+        'country_code': np.full(len(rows), 'IN', dtype=object),
+        'state_code': rows['state_code'].to_numpy(),
+        'district_code': rows['district_code'].to_numpy(),
+        'taluk_code': rows['taluk_code'].to_numpy(),
+    }
+    for topic in topics:
+        data[topic] = np.floor(rng.lognormal(4, 1.5, len(rows))).astype(np.int64)
+    return pd.DataFrame(data)
@@ -0,0 +1,62 @@
+"""
+Lazy, per-level loading of the boundary tables.
+
+A level is fetched from BigQuery into the snapshot store the first time it is
+needed and never again for that data version. Levels can be prefetched in the
+background; a foreground request for a level that is already being fetched
+waits for that download instead of starting a second one.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BoundaryLoader:
+
+    def __init__(self, store, download, max_workers=2):
+        """
+        store: SnapshotStore, download: (version, level, progress) -> None, writing the
+        level into the store (e.g. geo_ingest.stream_boundary_level)
+        """
+        self.store = store
+        self.download = download
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='boundary-prefetch')
+        self._inflight = {}  # (version, level) -> Future
+        self._lock = threading.Lock()
+
+    def _run(self, version, level, progress=None):
+        # whoever registers the future first downloads; everyone else waits on it
+        with self._lock:
+            future = self._inflight.get((version, level))
+            owner = future is None
+            if owner:
+                future = self._inflight[(version, level)] = Future()
+        if not owner:
+            return future.result()
+        try:
+            if not self.store.has(version, level):
+                self.download(version, level, progress)
+            future.set_result(None)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop((version, level), None)
+
+    def ensure(self, version, level, progress=None):
+        """block until the level is in the snapshot store; progress(done, total) reports rows"""
+        if not self.store.has(version, level):
+            self._run(version, level, progress)
+
+    def prefetch(self, version, levels):
+        """start background downloads for levels that are not stored or being fetched yet"""
+        for level in levels:
+            with self._lock:
+                busy = (version, level) in self._inflight
+            if not busy and not self.store.has(version, level):
+                self._executor.submit(self._run, version, level)
+
+    def load(self, version, level, columns=None):
+        """the level's GeoDataFrame, fetching it first if needed"""
+        self.ensure(version, level)
+        return self.store.read(level, version, columns=columns)
@@ -0,0 +1,131 @@
+"""
+Choropleth classification, computed server side.
+
+Counts per admin unit are heavily skewed, so colouring them on a linear scale
+leaves almost every unit in the lowest colour. Each scheme here turns a count
+vector into k classes with NumPy only; the map then receives class indices
+(-1 for units without data) instead of raw counts.
+
+Natural breaks is Fisher-Jenks (the optimal grouping minimising within-class
+squared deviation) solved on weighted unique values. Above MAX_BINS distinct
+values, the values are first pooled into MAX_BINS quantile bins, which keeps the
+Subdistricts level fast at a small loss of optimality.
+"""
+import numpy as np
+
+K = 5
+MAX_BINS = 512
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.isfinite(values)]
+
+
+def _edges(values, inner):
+    """
+    full break vector: [min, inner breaks..., max], without repeats; always at
+    least two edges, so all-equal values give one class [v, v]
+    """
+    low, high = values.min(), values.max()
+    inner = np.asarray(inner, dtype=np.float64)
+    # rounding (e.g. expm1(log1p(x))) must not put a break outside [min, max]
+    edges = np.unique(np.concatenate([[low], inner[(inner > low) & (inner < high)], [high]]))
+    return edges if len(edges) > 1 else np.repeat(edges, 2)
+
+
+###############################################
+## SCHEMES
+###############################################
+
+def quantile_breaks(values, k=K):
+    values = _finite(values)
+    if not len(values):
+        return np.array([0.0, 0.0])
+    return _edges(values, np.quantile(values, np.linspace(0, 1, k + 1)[1:-1]))
+
+
+def log_breaks(values, k=K):
+    """equal intervals of log(1 + x), for non-negative counts"""
+    values = _finite(values)
+    if not len(values):
+        return np.array([0.0, 0.0])
+    low, high = np.log1p(max(values.min(), 0.0)), np.log1p(max(values.max(), 0.0))
+    return _edges(values, np.expm1(np.linspace(low, high, k + 1)[1:-1]))
+
+
+def _bins(values, max_bins):
+    """
+    (sorted bin values, weights, bin upper bounds): the unique values themselves,
+    or quantile bins (mean, size, largest value) when there are too many
+    """
+    unique, counts = np.unique(values, return_counts=True)
+    if len(unique) <= max_bins:
+        return unique, counts.astype(np.float64), unique
+    bin_of = np.minimum((np.cumsum(counts) - counts) * max_bins // counts.sum(), max_bins - 1)
+    weights = np.bincount(bin_of, weights=counts, minlength=max_bins)
+    sums = np.bincount(bin_of, weights=unique * counts, minlength=max_bins)
+    keep = weights > 0
+    last = np.searchsorted(bin_of, np.arange(max_bins), side='right') - 1
+    return sums[keep] / weights[keep], weights[keep], unique[last[keep]]
+
+
+def _fisher_jenks(v, w, k):
+    """indices in v where each of the k classes ends, by weighted dynamic programming"""
+    m = len(v)
+    W, S, S2 = (np.concatenate([[0.0], np.cumsum(a)]) for a in (w, w * v, w * v * v))
+    i, j = np.triu_indices(m)
+    # ssd[i, j]: squared deviation of the class v[i..j]
+    ssd = np.full((m, m), np.inf)
+    n = W[j + 1] - W[i]
+    ssd[i, j] = (S2[j + 1] - S2[i]) - (S[j + 1] - S[i]) ** 2 / n
+
+    cost = ssd[0].copy()  # best cost of classes covering v[0..j], one class
+    start = [np.zeros(m, dtype=np.int64)]
+    for _ in range(1, k):
+        # last class v[i..j] after the best (c - 1)-class split of v[0..i-1]
+        total = np.vstack([np.full(m, np.inf), cost[:-1, None] + ssd[1:]])
+        best = np.argmin(total, axis=0)
+        cost = total[best, np.arange(m)]
+        start.append(best)
+
+    ends, j = [], m - 1
+    for c in range(k - 1, -1, -1):
+        ends.append(j)
+        j = start[c][j] - 1
+        if j < 0:
+            break
+    return np.array(ends[::-1])
+
+
+def jenks_breaks(values, k=K, max_bins=MAX_BINS):
+    """natural breaks; exact up to max_bins distinct values, approximate (binned) above"""
+    values = _finite(values)
+    if not len(values):
+        return np.array([0.0, 0.0])
+    v, w, uppers = _bins(values, max_bins)
+    ends = _fisher_jenks(v, w, min(k, len(v)))
+    return _edges(values, uppers[ends[:-1]])
+
+
+SCHEMES = {
+    'Quantile': quantile_breaks,
+    'Natural breaks': jenks_breaks,
+    'Log': log_breaks,
+}
+
+
+###############################################
+## CLASSES
+###############################################
+
+def classify(values, breaks):
+    """class index per value for breaks [b0, b1, ..., bk]: (b_i, b_i+1] -> i, the minimum -> 0, NaN -> -1"""
+    values = np.asarray(values, dtype=np.float64)
+    classes = np.searchsorted(breaks[1:-1], values, side='left').astype(np.int16)
+    classes[~np.isfinite(values)] = -1
+    return classes
+
+
+def class_labels(breaks):
+    return [f"{low:,.0f} - {high:,.0f}" for low, high in zip(breaks[:-1], breaks[1:])]
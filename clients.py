@@ -0,0 +1,145 @@
+"""
+Process-wide lifecycle for the BigQuery and DuckDB clients.
+
+Streamlit reruns the whole script on every widget interaction, so anything
+created at the top of it is rebuilt each time. A ClientManager is built once
+per process (behind st.experimental_singleton) and owns:
+
+- the service-account credentials, refreshed by a background thread shortly
+  before they expire, so no rerun ever waits for a token exchange;
+- one keep-alive HTTP session (AuthorizedSession over a pooled requests
+  adapter) shared by the BigQuery REST client;
+- a BigQuery Storage read client, whose gRPC channel stays open between
+  downloads;
+- the process-wide DuckDB connection from duck_engine.
+
+health() probes each of them on demand.
+"""
+import datetime
+import threading
+import time
+
+import google.auth.transport.requests
+import requests
+from google.cloud import bigquery
+from google.oauth2 import service_account
+
+import duck_engine
+
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+REFRESH_MARGIN = 300  # seconds before expiry at which the token is renewed
+POOL_SIZE = 16
+
+
+class _SerializedRequest(google.auth.transport.requests.Request):
+    """token-endpoint transport over its own plain session, one exchange at a time"""
+
+    def __init__(self, session, lock):
+        super().__init__(session)
+        self._lock = lock
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return super().__call__(*args, **kwargs)
+
+
+class ClientManager:
+
+    def __init__(self, service_account_info, scopes=SCOPES, pool_size=POOL_SIZE, refresh_margin=REFRESH_MARGIN):
+        self.credentials = service_account.Credentials.from_service_account_info(service_account_info, scopes=scopes)
+        self.project = service_account_info.get('project_id')
+        self.refresh_margin = refresh_margin
+
+        # token exchanges go over a separate, unauthenticated session: never with a bearer
+        # token attached, and never nested inside the authorized session's own refresh.
+        # The AuthorizedSession's lazy refresh uses the same transport, so it takes the lock too.
+        self._refresh_lock = threading.RLock()
+        self._token_session = requests.Session()
+        self._request = _SerializedRequest(self._token_session, self._refresh_lock)
+
+        self.session = google.auth.transport.requests.AuthorizedSession(self.credentials, auth_request=self._request)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+        self.bigquery = bigquery.Client(project=self.project, credentials=self.credentials, _http=self.session)
+        self._bqstorage = None
+        self._lock = threading.Lock()
+
+        # the first token is fetched by the refresher, so an offline start does not fail here
+        self._stop = threading.Event()
+        self._refresher = threading.Thread(target=self._refresh_loop, name='credentials-refresh', daemon=True)
+        self._refresher.start()
+
+    ###############################################
+    ## TOKENS
+    ###############################################
+
+    def refresh(self):
+        with self._refresh_lock:
+            self.credentials.refresh(self._request)
+
+    def _seconds_left(self):
+        expiry = self.credentials.expiry  # naive UTC
+        if expiry is None:
+            return 0.0
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            wait = max(self._seconds_left() - self.refresh_margin, 0.0)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.refresh()
+            except Exception:
+                # try again shortly; requests still refresh lazily if the token runs out
+                self._stop.wait(30)
+
+    def close(self):
+        self._stop.set()
+        self.session.close()
+        self._token_session.close()
+        self.bigquery.close()
+
+    ###############################################
+    ## CLIENTS
+    ###############################################
+
+    @property
+    def bqstorage(self):
+        """BigQuery Storage read client, created on first use and kept for the process"""
+        with self._lock:
+            if self._bqstorage is None:
+                from google.cloud import bigquery_storage
+                self._bqstorage = bigquery_storage.BigQueryReadClient(credentials=self.credentials)
+            return self._bqstorage
+
+    @property
+    def duckdb(self):
+        return duck_engine.connection()
+
+    ###############################################
+    ## HEALTH
+    ###############################################
+
+    def _probe(self, check):
+        start = time.perf_counter()
+        try:
+            check()
+        except Exception as e:
+            return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        return {'ok': True, 'ms': round((time.perf_counter() - start) * 1000, 1)}
+
+    def health(self):
+        """status of the token, BigQuery (a metadata call, no query job) and DuckDB"""
+        return {
+            'credentials': {
+                'ok': self.credentials.valid,
+                'expires in s': round(self._seconds_left()),
+                'refresher alive': self._refresher.is_alive(),
+            },
+            'bigquery': self._probe(lambda: list(self.bigquery.list_datasets(max_results=1))),
+            # through query_arrow, which holds the engine lock the shared connection needs
+            'duckdb': self._probe(lambda: duck_engine.query_arrow('SELECT 1')),
+        }
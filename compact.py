@@ -0,0 +1,121 @@
+"""
+Compact in-memory representation of the enriched subdistrict table.
+
+Admin codes become categoricals (small integer codes plus one copy of each
+string). Categories are ordered along the admin hierarchy, so the units of one
+parent get contiguous integer codes. Count columns are downcast to the smallest
+integer width that holds their values.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+HIERARCHY = ['country_code', 'state_code', 'district_code', 'taluk_code']
+
+
+def _hierarchy_categories(df, hierarchy):
+    # unique code paths sorted parent-first: every level's categories follow that order
+    paths = df[hierarchy].drop_duplicates().astype(object).sort_values(hierarchy)
+    return {col: pd.unique(paths[col].dropna()) for col in hierarchy}
+
+
+def order_hierarchy(df, hierarchy=HIERARCHY):
+    """(re)build the code categoricals with categories ordered along the admin hierarchy"""
+    hierarchy = [c for c in hierarchy if c in df.columns]
+    categories = _hierarchy_categories(df, hierarchy)
+    return df.assign(**{col: pd.Categorical(df[col], categories=categories[col]) for col in hierarchy})
+
+
+def _downcast(series):
+    if series.isna().any():
+        # nullable integers: pick the smallest masked dtype that fits
+        values = series.dropna()
+        low, high = (values.min(), values.max()) if len(values) else (0, 0)
+        for dtype in (['UInt8', 'UInt16', 'UInt32', 'UInt64'] if low >= 0 else ['Int8', 'Int16', 'Int32', 'Int64']):
+            info = np.iinfo(dtype.lower())
+            if info.min <= low and high <= info.max:
+                return series.astype(dtype)
+        return series
+    return pd.to_numeric(series, downcast='unsigned' if series.min() >= 0 else 'integer')
+
+
+def compact_enriched(df, hierarchy=HIERARCHY):
+    """dictionary-encode the admin codes and downcast the integer count columns"""
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col not in hierarchy and pd.api.types.is_integer_dtype(series.dtype):
+            out[col] = _downcast(series)
+        else:
+            out[col] = series
+    return order_hierarchy(pd.DataFrame(out, index=df.index), hierarchy)
+
+
+###############################################
+## STREAMING (one arrow batch at a time)
+###############################################
+
+def integer_ranges_sql(table, columns):
+    """one-row query with the min and max of each integer column, to fix widths before streaming"""
+    parts = ', '.join(f"MIN({c}) AS {c}__min, MAX({c}) AS {c}__max" for c in columns)
+    return f"SELECT {parts} FROM `{table}`"
+
+
+def smallest_integer_type(low, high):
+    """narrowest arrow integer type holding [low, high]"""
+    low, high = low or 0, high or 0
+    candidates = (
+        [pa.uint8(), pa.uint16(), pa.uint32(), pa.uint64()] if low >= 0
+        else [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+    )
+    for arrow_type in candidates:
+        info = np.iinfo(arrow_type.to_pandas_dtype())
+        if info.min <= low and high <= info.max:
+            return arrow_type
+    return pa.int64()
+
+
+def count_types(ranges, columns):
+    """column -> arrow type, from the single row returned by integer_ranges_sql"""
+    return {c: smallest_integer_type(ranges[f"{c}__min"], ranges[f"{c}__max"]) for c in columns}
+
+
+def compact_batch(batch, types, hierarchy=HIERARCHY):
+    """dictionary-encode the code columns and cast the counts of one record batch"""
+    arrays, fields = [], []
+    for field, column in zip(batch.schema, batch.columns):
+        if field.name in hierarchy:
+            column = pc.dictionary_encode(column)
+        elif field.name in types:
+            column = column.cast(types[field.name])
+        arrays.append(column)
+        fields.append(pa.field(field.name, column.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def widen(df):
+    """the plain representation read_gbq returns: object codes and int64 counts"""
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            out[col] = series.astype(object)
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            out[col] = series.astype('Int64' if series.isna().any() else 'int64')
+        else:
+            out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_report(before, after):
+    """per-column deep memory use in bytes, before and after compaction"""
+    report = pd.DataFrame({
+        'dtype before': before.dtypes.astype(str),
+        'dtype after': after.dtypes.astype(str),
+        'bytes before': before.memory_usage(deep=True, index=False),
+        'bytes after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = ['', '', report['bytes before'].sum(), report['bytes after'].sum()]
+    report['ratio'] = report['bytes before'] / report['bytes after']
+    return report
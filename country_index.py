@@ -0,0 +1,131 @@
+"""
+Local index of the country boundaries used as ROIs on the Earth Engine pages.
+
+Names, bounding boxes and simplified outlines of users/giswqs/public/countries
+are kept in a GeoParquet file next to the snapshots. The country dropdown, map
+centering and ROI outline are served from it, without a blocking round trip
+to Earth Engine on every rerun. Earth Engine is only asked when the file does
+not exist yet (blocking, once) or is older than REFRESH_SECONDS (in a background
+thread, while the old index keeps serving). `python country_index.py` refreshes it
+from a scheduler.
+"""
+import os
+import threading
+import time
+
+import geopandas as gpd
+
+import snapshot_store
+
+INDEX_PATH = os.environ.get('GEOAPP_COUNTRY_INDEX', os.path.join(snapshot_store.SNAPSHOT_DIR, 'countries.parquet'))
+REFRESH_SECONDS = float(os.environ.get('GEOAPP_COUNTRY_REFRESH', 7 * 24 * 3600))
+SIMPLIFY_METERS = 1000
+
+
+def fetch_countries(max_error=SIMPLIFY_METERS):
+    """country names and outlines from Earth Engine, simplified server side"""
+    import dataset_registry
+    simplified = dataset_registry.countries().map(lambda f: f.simplify(max_error)).select(['name'])
+    gdf = gpd.GeoDataFrame.from_features(simplified.getInfo()['features'], crs='EPSG:4326')
+    return gdf[['name', 'geometry']]
+
+
+def _with_bounds(gdf):
+    bounds = gdf.geometry.bounds
+    gdf = gdf.assign(minx=bounds['minx'], miny=bounds['miny'], maxx=bounds['maxx'], maxy=bounds['maxy'])
+    return gdf.sort_values('name').reset_index(drop=True)
+
+
+class CountryIndex:
+
+    def __init__(self, path=INDEX_PATH, fetch=fetch_countries, refresh_seconds=REFRESH_SECONDS):
+        self.path = path
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self._gdf = None
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+        self._refreshing = None
+
+    def _write(self, gdf):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        snapshot_store.atomic_write(self.path, lambda tmp: _with_bounds(gdf).to_parquet(tmp))
+
+    def refresh(self):
+        """fetch from Earth Engine and replace the stored index"""
+        self._write(self.fetch())
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self.refresh, name='country-index-refresh', daemon=True)
+            self._refreshing.start()
+
+    def frame(self):
+        """the index as a GeoDataFrame (name, geometry, minx, miny, maxx, maxy), sorted by name"""
+        if not os.path.exists(self.path):
+            self.refresh()
+        mtime = os.path.getmtime(self.path)
+        if time.time() - mtime > self.refresh_seconds:
+            self._refresh_in_background()
+        with self._lock:
+            if self._gdf is None or self._loaded_mtime != mtime:
+                self._gdf = gpd.read_parquet(self.path)
+                self._loaded_mtime = mtime
+            return self._gdf
+
+    def names(self):
+        return self.frame()['name'].tolist()
+
+    def _rows(self, name=None):
+        gdf = self.frame()
+        return gdf if name is None else gdf[gdf['name'] == name]
+
+    def bounds(self, name=None):
+        """[[south, west], [north, east]] of one country (all of them when name is None), for fit_bounds"""
+        rows = self._rows(name)
+        return [[float(rows['miny'].min()), float(rows['minx'].min())],
+                [float(rows['maxy'].max()), float(rows['maxx'].max())]]
+
+    def outline(self, name=None, tolerance=0.0):
+        """the simplified outline(s) as a GeoDataFrame, optionally simplified further (degrees)"""
+        rows = self._rows(name)[['name', 'geometry']]
+        return rows.assign(geometry=rows.geometry.simplify(tolerance)) if tolerance else rows
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """the process-wide index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CountryIndex()
+        return _index
+
+
+def outline_layer(gdf, name, color='#000000', width=1, show=True):
+    """a folium layer drawing ROI outlines from local geometry, instead of an Earth Engine tile layer"""
+    import folium
+    color = '#' + color.lstrip('#')[:6]  # Earth Engine style colours may carry an alpha suffix
+    return folium.GeoJson(
+        gdf.to_json(), name=name, show=show,
+        style_function=lambda feature: {'color': color, 'weight': width, 'fillOpacity': 0},
+    )
+
+
+def gdf_bounds(gdf):
+    """[[south, west], [north, east]] of a GeoDataFrame, e.g. an uploaded ROI"""
+    minx, miny, maxx, maxy = gdf.to_crs('EPSG:4326').total_bounds
+    return [[float(miny), float(minx)], [float(maxy), float(maxx)]]
+
+
+if __name__ == '__main__':
+    # scheduled refresh, e.g. from cron: python country_index.py
+    import ee
+    ee.Initialize()
+    get_index().refresh()
+    print(f"{len(get_index().names())} countries written to {INDEX_PATH}")
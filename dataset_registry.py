@@ -0,0 +1,252 @@
+"""
+Registry of the surface water datasets shown on the Earth Engine pages.
+
+Each entry declares its asset, how the water class is extracted, its default
+and water-only vis params and its legend. Constructed Earth Engine expressions
+are memoized per (dataset, water_only, ROI key) for the life of the process,
+so every page and every rerun gets the very same object back. Because the
+objects are identical, their serialized graphs are too, which makes
+results keyed on them (tile URLs, area statistics) shared between pages.
+
+    image = dataset_registry.layer(name, water_only, roi, roi_key)
+"""
+import collections
+import threading
+
+import ee
+
+COUNTRIES_ASSET = 'users/giswqs/public/countries'
+WORLD_BBOX = (-179, -89, 179, 89)
+MAX_OBJECTS = 512
+
+_lock = threading.Lock()
+_objects = collections.OrderedDict()  # key -> ee object, least recently used first
+
+
+def memoized(key, build):
+    """the object stored under key, building it on first use"""
+    with _lock:
+        if key in _objects:
+            _objects.move_to_end(key)
+            return _objects[key]
+    value = build()
+    with _lock:
+        value = _objects.setdefault(key, value)
+        _objects.move_to_end(key)
+        while len(_objects) > MAX_OBJECTS:
+            _objects.popitem(last=False)
+    return value
+
+
+###############################################
+## DATASETS
+###############################################
+
+class Dataset:
+
+    def __init__(self, name, build, vis, water=None, water_vis=None, vector=False,
+                 legend_title='Legend', legend=None, builtin_legend=None, colorbar=None, overlays=None):
+        """
+        build: (region, water_only) -> ee.Image / ee.FeatureCollection, water: image -> water mask,
+        legend: vis params -> {label: colour}, overlays: region -> [(ee object, vis, name)]
+        """
+        self.name = name
+        self.build = build
+        self.default_vis = vis
+        self.water = water
+        self.water_vis = water_vis if water_vis is not None else vis
+        self.vector = vector
+        self.legend_title = legend_title
+        self.legend = legend
+        self.builtin_legend = builtin_legend
+        self.colorbar = colorbar
+        self.overlays = overlays
+
+    def vis(self, water_only=False):
+        return dict(self.water_vis if water_only else self.default_vis)
+
+    def vis_text(self, water_only=False):
+        """vis params as the editable text the pages show"""
+        return str(self.vis(water_only))
+
+    def construct(self, region=None, water_only=False):
+        obj = self.build(region, water_only)
+        if water_only and self.water is not None:
+            obj = self.water(obj)
+        if region is not None:
+            obj = obj.filterBounds(region) if self.vector else obj.clip(region)
+        return obj
+
+
+def _image(asset, band=None):
+    def build(region, water_only):
+        image = ee.Image(asset)
+        return image.select(band) if band else image
+    return build
+
+
+def _mosaic(asset):
+    return lambda region, water_only: ee.ImageCollection(asset).mosaic()
+
+
+def _dynamic_world(region, water_only):
+    import geemap.foliumap as geemap
+    region = region if region is not None else ee.Geometry.BBox(*WORLD_BBOX)
+    return geemap.dynamic_world(region, '2020-01-01', '2021-01-01', return_type='class' if water_only else 'hillshade')
+
+
+def _monthly_history(region, water_only):
+    return (
+        ee.ImageCollection('JRC/GSW1_3/MonthlyHistory')
+        .map(lambda img: img.eq(2).selfMask())
+        .max()
+        .selfMask()
+    )
+
+
+def _grwl_vector(region):
+    vector = ee.FeatureCollection('projects/sat-io/open-datasets/GRWL/water_vector_v01_01')
+    if region is not None:
+        vector = vector.filterBounds(region)
+    return [(vector.style(**{'fillColor': '00000000', 'color': 'FF5500'}), {}, 'GRWL Vector')]
+
+
+def _water(vis):
+    return {'Water': vis['palette'][0]}
+
+
+DATASETS = collections.OrderedDict((d.name, d) for d in [
+    Dataset(
+        'JRC Max Water Extent (1984-2020)',
+        lambda region, water_only: ee.Image('JRC/GSW1_3/GlobalSurfaceWater').select('max_extent').selfMask(),
+        {'min': 1, 'max': 1, 'palette': ['0000ff']},
+        legend_title='JRC Water', legend=_water,
+    ),
+    Dataset(
+        'JRC Water Occurrence (1984-2020)',
+        _image('JRC/GSW1_3/GlobalSurfaceWater', 'occurrence'),
+        {'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']},
+        colorbar='Water occurrence (%)',
+    ),
+    Dataset(
+        'JRC Monthly Water History (1984-2020)',
+        _monthly_history,
+        {'min': 0, 'max': 2, 'palette': ['ffffff', 'fffcb8', '0905ff']},
+        water_vis={'min': 1, 'max': 1, 'palette': ['0000ff']},
+        legend=_water,
+    ),
+    Dataset(
+        'Dynamic World 2020',
+        _dynamic_world,
+        {},
+        water=lambda image: image.eq(0).selfMask(),
+        water_vis={'min': 1, 'max': 1, 'palette': ['419BDF']},
+        legend_title='Dynamic World Land Cover', legend=_water, builtin_legend='Dynamic_World',
+    ),
+    Dataset(
+        'ESA Global Land Cover 2020',
+        lambda region, water_only: ee.ImageCollection('ESA/WorldCover/v100').first(),
+        {'bands': ['Map']},
+        water=lambda image: image.eq(80).selfMask(),
+        water_vis={'min': 1, 'max': 1, 'palette': ['0064c8']},
+        legend_title='ESA Land Cover', legend=_water, builtin_legend='ESA_WorldCover',
+    ),
+    Dataset(
+        'ESRI Global Land Cover 2020',
+        _mosaic('projects/sat-io/open-datasets/landcover/ESRI_Global-LULC_10m'),
+        {'min': 1, 'max': 10, 'palette': ['#1A5BAB', '#358221', '#A7D282', '#87D19E', '#FFDB5C',
+                                          '#EECFA8', '#ED022A', '#EDE9E4', '#F2FAFF', '#C8C8C8']},
+        water=lambda image: image.eq(1).selfMask(),
+        water_vis={'min': 1, 'max': 1, 'palette': ['#1A5BAB']},
+        legend_title='ESRI Land Cover', legend=_water, builtin_legend='ESRI_LandCover',
+    ),
+    Dataset(
+        'OpenStreetMap Water Layer',
+        _mosaic('projects/sat-io/open-datasets/OSM_waterLayer'),
+        {'min': 1, 'max': 5, 'palette': ['08306b', '08519c', '2171b5', '4292c6', '6baed6']},
+        legend_title='OSM Water Layer',
+        legend=lambda vis: {'Ocean': '08306b', 'Large Lake/River': '08519c', 'Major River': '2171b5',
+                            'Canal': '4292c6', 'Small Stream': '6baed6'},
+    ),
+    Dataset(
+        'Global River Width (GRWL)',
+        _mosaic('projects/sat-io/open-datasets/GRWL/water_mask_v01_01'),
+        {'min': 255, 'max': 255, 'palette': ['#0000ff']},
+        legend_title='Global River Width',
+        legend=lambda vis: {'Water': vis['palette'][0], 'River Centerline': '#FF5500'},
+        overlays=_grwl_vector,
+    ),
+    Dataset(
+        'Global floodplains (GFPLAIN250m)',
+        _mosaic('projects/sat-io/open-datasets/GFPLAIN250'),
+        {'palette': ['#0000ff']},
+        legend_title='Global floodplains', legend=_water,
+    ),
+    Dataset(
+        'HydroLAKES',
+        lambda region, water_only: ee.FeatureCollection('projects/sat-io/open-datasets/HydroLakes/lake_poly_v10'),
+        {'color': '#00008B'},
+        vector=True, legend_title='HydroLAKES', legend=lambda vis: {'Lake': vis['color']},
+    ),
+])
+
+# pages 1 and 2 show the static layers; page 3 adds the monthly history
+MAP_DATASETS = [name for name in DATASETS if name != 'JRC Monthly Water History (1984-2020)']
+ANALYSIS_DATASETS = list(DATASETS)
+
+
+def get(name):
+    return DATASETS[name]
+
+
+###############################################
+## MEMOIZED EXPRESSIONS
+###############################################
+
+def countries():
+    """the country boundaries used for country ROIs"""
+    return memoized(('countries',), lambda: ee.FeatureCollection(COUNTRIES_ASSET))
+
+
+def country_roi(name):
+    return memoized(('roi', 'country', name), lambda: countries().filter(ee.Filter.eq('name', name)))
+
+
+def region(key, build):
+    """an ROI object memoized under a caller-chosen key (e.g. an uploaded file's content hash)"""
+    return memoized(('roi',) + tuple(key), build)
+
+
+def layer(name, water_only=False, roi=None, roi_key=None):
+    """
+    the Earth Engine expression for a dataset clipped to roi; roi_key identifies the
+    ROI in O(1) (defaults to its serialized graph)
+    """
+    dataset = get(name)
+    if roi is not None and roi_key is None:
+        roi_key = ('graph', roi.serialize())
+    # datasets without a water expression build the same object either way
+    water_only = bool(water_only and dataset.water is not None)
+    return memoized(('layer', name, water_only, roi_key), lambda: dataset.construct(roi, water_only))
+
+
+def overlays(name, roi=None, roi_key=None):
+    """extra (ee object, vis, layer name) drawn on top of a dataset, e.g. the GRWL centerlines"""
+    dataset = get(name)
+    if dataset.overlays is None:
+        return []
+    if roi is not None and roi_key is None:
+        roi_key = ('graph', roi.serialize())
+    return memoized(('overlays', name, roi_key), lambda: dataset.overlays(roi))
+
+
+def add_legend(Map, name, vis_params, water_only=False):
+    """the dataset's legend or colorbar, as the pages used to draw it"""
+    dataset = get(name)
+    if dataset.colorbar is not None:
+        Map.add_colorbar(vis_params, label=dataset.colorbar)
+    elif dataset.builtin_legend is not None and not water_only:
+        Map.add_legend(title=dataset.legend_title, builtin_legend=dataset.builtin_legend)
+    elif dataset.legend is not None:
+        title = 'Legend' if dataset.builtin_legend is not None else dataset.legend_title
+        Map.add_legend(title=title, legend_dict=dataset.legend(vis_params))
@@ -0,0 +1,75 @@
+"""
+Process-wide DuckDB engine.
+
+One in-memory connection per process. Frames are registered as Arrow tables
+once per data version (DuckDB scans Arrow in place, no copy) and every
+level/topic aggregation runs as DuckDB SQL, returning Arrow.
+"""
+import os
+import threading
+
+import duckdb
+import pyarrow as pa
+
+ROW_COLUMN = '_row'
+
+_lock = threading.RLock()
+_con = None
+_registered = {}  # name -> (version, arrow table); the table reference keeps the scan source alive
+
+
+def connection():
+    """the process-wide connection, created on first use"""
+    global _con
+    with _lock:
+        if _con is None:
+            _con = duckdb.connect(database=':memory:')
+            _con.execute(f"PRAGMA threads={os.cpu_count() or 1}")
+        return _con
+
+
+def register_arrow(name, table, version=None):
+    """register an arrow table under `name`; a no-op if this version is already registered"""
+    with _lock:
+        if version is not None and _registered.get(name, (None,))[0] == version:
+            return False
+        con = connection()
+        con.register(name, table)
+        _registered[name] = (version, table)
+        return True
+
+
+def with_row_numbers(table):
+    """append the positional row id used to align results to a boundary frame"""
+    return table.append_column(ROW_COLUMN, pa.array(range(table.num_rows), type=pa.int64()))
+
+
+def _fetch_arrow(result):
+    if hasattr(result, 'to_arrow_table'):
+        return result.to_arrow_table()
+    return result.fetch_arrow_table()
+
+
+def query_arrow(sql, params=None):
+    """run SQL on the shared connection and return an arrow table"""
+    # the connection is not safe for concurrent use; DuckDB parallelizes each query internally
+    with _lock:
+        result = connection().execute(sql, params or [])
+        return _fetch_arrow(result)
+
+
+def level_topic_sums(level, key, topics, facts='allcounts'):
+    """
+    topic sums for every row of the registered boundary table `level`, in row order
+    (NULL where a unit has no rows in `facts`), i.e. a positional left join
+    """
+    # DOUBLE: exact for counts below 2**53 and independent of the (downcast) input widths
+    sums = ', '.join(f'CAST(SUM(a."{t}") AS DOUBLE) AS "{t}"' for t in topics)
+    sql = f"""
+        SELECT b.{ROW_COLUMN}, {sums}
+        FROM "{level}" b
+        LEFT JOIN "{facts}" a ON b."{key}" = a."{key}"
+        GROUP BY b.{ROW_COLUMN}
+        ORDER BY b.{ROW_COLUMN}
+        """
+    return query_arrow(sql)
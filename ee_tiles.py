@@ -0,0 +1,128 @@
+"""
+Cached Earth Engine tile URLs.
+
+geemap's ee_tile_layer and Map.add_layer call getMapId, a blocking round trip
+to Earth Engine, every time a page reruns, even when neither the layer nor its
+vis params changed (moving the map, switching the basemap). Here the tile URL
+template is kept in the shared result cache, keyed on the serialized Earth
+Engine expression plus the vis params, for TILE_URL_TTL seconds, so only a
+changed layer asks Earth Engine for a new map ID.
+
+With the tile proxy enabled (tile_proxy.ENABLED), layers point at the proxy
+under a stable layer id instead, and the upstream URL is only resolved when
+the proxy misses a tile.
+
+    ee_tiles.add_layer(Map, image, vis_params, 'name')           # instead of Map.add_layer
+    layer = ee_tiles.ee_tile_layer(image, vis_params, 'name')   # instead of geemap.ee_tile_layer
+"""
+import copy
+import hashlib
+import json
+import os
+
+import ee
+import folium
+
+import tile_proxy
+from result_cache import cache, make_key
+
+# map IDs are issued against the OAuth token; keep URLs a little shorter than its one hour lifetime
+TILE_URL_TTL = int(os.environ.get('GEOAPP_TILE_URL_TTL', 55 * 60))
+
+
+def _normalize(vis_params):
+    vis_params = copy.deepcopy(dict(vis_params or {}))
+    palette = vis_params.get('palette')
+    if isinstance(palette, tuple):
+        vis_params['palette'] = list(palette)
+    elif isinstance(palette, str):
+        from geemap.common import check_cmap
+        vis_params['palette'] = check_cmap(palette)
+    elif palette is not None and not isinstance(palette, list) and hasattr(palette, 'get'):
+        vis_params['palette'] = palette['default']  # a geemap colormap Box
+    return vis_params
+
+
+def as_image(ee_object, vis_params):
+    """what geemap renders for an object: vectors become a styled fill + outline image"""
+    if isinstance(ee_object, (ee.Geometry, ee.Feature, ee.FeatureCollection)):
+        features = ee.FeatureCollection(ee_object)
+        width = vis_params.get('width', 2)
+        color = vis_params.get('color', '000000')
+        fill = features.style(**{'fillColor': color}).updateMask(ee.Image.constant(0.5))
+        outline = features.style(**{'color': color, 'fillColor': '00000000', 'width': width})
+        return fill.blend(outline)
+    if isinstance(ee_object, ee.ImageCollection):
+        return ee_object.mosaic()
+    if isinstance(ee_object, ee.Image):
+        return ee_object
+    raise AttributeError(
+        "The image argument in 'addLayer' function must be an instance of one of "
+        "ee.Image, ee.Geometry, ee.Feature or ee.FeatureCollection."
+    )
+
+
+def _tile_key(ee_object, vis_params):
+    return ee_object.serialize(), json.dumps(vis_params, sort_keys=True, default=str)
+
+
+@cache.memoize(ttl=TILE_URL_TTL, name='ee.getMapId', key=_tile_key)
+def _url_format(ee_object, vis_params):
+    return ee.Image(as_image(ee_object, vis_params)).getMapId(vis_params)['tile_fetcher'].url_format
+
+
+def invalidate_tile_url(ee_object, vis_params=None):
+    """forget the cached tile URL, e.g. after Earth Engine rejected its map ID"""
+    cache.delete(make_key('ee.getMapId', (_tile_key(ee_object, _normalize(vis_params)),)))
+
+
+def tile_url(ee_object, vis_params=None):
+    """XYZ tile URL template for an object and vis params, from the cache when possible"""
+    return _url_format(ee_object, _normalize(vis_params))
+
+
+def layer_id(ee_object, vis_params=None):
+    """stable id of an expression + vis params, which outlives the map IDs Earth Engine issues for it"""
+    key = _tile_key(ee_object, _normalize(vis_params))
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()[:24]
+
+
+def register(proxy, ee_object, vis_params=None):
+    """route a layer through a tile_proxy.TileProxy and return its layer id"""
+    vis_params = _normalize(vis_params)
+    layer = layer_id(ee_object, vis_params)
+    proxy.register(
+        layer,
+        lambda: _url_format(ee_object, vis_params),
+        lambda: invalidate_tile_url(ee_object, vis_params),
+    )
+    return layer
+
+
+def browser_url(ee_object, vis_params=None):
+    """the tile URL template the map should use: the proxy's when enabled, else Earth Engine's"""
+    if tile_proxy.ENABLED:
+        return tile_proxy.tile_url(register(tile_proxy.get_proxy(), ee_object, vis_params))
+    return tile_url(ee_object, vis_params)
+
+
+def ee_tile_layer(ee_object, vis_params=None, name='Layer untitled', shown=True, opacity=1.0, **kwargs):
+    """drop-in for geemap.foliumap.ee_tile_layer, through the tile proxy or with a cached tile URL"""
+    return folium.raster_layers.TileLayer(
+        tiles=browser_url(ee_object, vis_params),
+        attr='Google Earth Engine',
+        name=name,
+        overlay=True,
+        control=True,
+        opacity=opacity,
+        show=shown,
+        max_zoom=24,
+        **kwargs,
+    )
+
+
+def add_layer(Map, ee_object, vis_params=None, name='Layer untitled', shown=True, opacity=1.0, **kwargs):
+    """drop-in for Map.add_layer / Map.addLayer with a cached tile URL"""
+    layer = ee_tile_layer(ee_object, vis_params, name, shown, opacity, **kwargs)
+    layer.add_to(Map)
+    return layer
@@ -0,0 +1,177 @@
+"""
+Arrow / WKB ingest for the admin boundary tables.
+
+BigQuery converts the geometries to WKB server side. Query results are streamed
+batch by batch straight into the snapshot store (stream_table /
+stream_boundary_level), so peak memory is bounded by the batch size rather
+than the table size. Boundary levels are written as GeoParquet with the WKB
+untouched; they are decoded in bulk when the snapshot is read
+(geopandas.read_parquet), not during ingest.
+
+decode_geometry / arrow_to_gdf decode a WKB or WKT arrow column with shapely 2
+in one vectorized call. They serve the local fixtures (write_fixture /
+read_fixture) that the benchmarks use.
+"""
+import json
+import logging
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyproj
+import shapely
+
+###############################################
+## BOUNDARY TABLES
+###############################################
+
+BOUNDARY_TABLES = {
+    'Country': ('dev-ind-geo-01.geoprocessed.country', ['country_code', 'country_name']),
+    'States': ('dev-ind-geo-01.geoprocessed.states', ['state_code', 'state_name']),
+    'Districts': ('dev-ind-geo-01.geoprocessed.districts', ['district_code', 'district_name']),
+    'Subdistricts': ('dev-ind-geo-01.geoprocessed.subdistricts', ['taluk_code', 'taluk_name']),
+    'Parlamentary Constituencies': ('dev-ind-geo-01.geoprocessed.parliamentary_constituencies', ['pc_code', 'pc_name']),
+    'Assembly Consituencies': ('dev-ind-geo-01.geoprocessed.assembly_constituencies', ['ac_code', 'ac_name']),
+}
+
+GEOMETRY_COLUMN = 'geom_wkb'
+REPAIRED_COLUMN = 'geom_repaired'
+BATCH_ROWS = 50_000
+
+log = logging.getLogger(__name__)
+
+
+def boundary_query(level):
+    """
+    SQL for one boundary level, with the geometry converted to WKB server side;
+    REPAIRED_COLUMN flags the rows that only parse with make_valid, whose rings may
+    have been changed or dropped by the repair
+    """
+    table, columns = BOUNDARY_TABLES[level]
+    return f"""
+            SELECT {', '.join(columns)},
+                   ST_ASBINARY(ST_GEOGFROMTEXT(geom_text, make_valid => TRUE)) AS {GEOMETRY_COLUMN},
+                   geom_text IS NOT NULL AND SAFE.ST_GEOGFROMTEXT(geom_text) IS NULL AS {REPAIRED_COLUMN}
+            FROM `{table}`
+            """
+
+
+###############################################
+## DECODING
+###############################################
+
+def _decode_chunk(chunk):
+    values = chunk.to_numpy(zero_copy_only=False)
+    if pa.types.is_binary(chunk.type) or pa.types.is_large_binary(chunk.type):
+        return shapely.from_wkb(values)
+    if pa.types.is_string(chunk.type) or pa.types.is_large_string(chunk.type):
+        return shapely.from_wkt(values)
+    raise TypeError(f"Cannot decode geometries from arrow type {chunk.type}")
+
+
+def decode_geometry(column):
+    """decode a WKB (binary) or WKT (string) arrow column into a shapely geometry array"""
+    if isinstance(column, pa.ChunkedArray):
+        chunks = [_decode_chunk(chunk) for chunk in column.chunks]
+        if not chunks:
+            return np.empty(0, dtype=object)
+        return np.concatenate(chunks)
+    return _decode_chunk(column)
+
+
+def arrow_to_gdf(table, geometry_column=GEOMETRY_COLUMN, crs="EPSG:4326"):
+    """turn an arrow table with an encoded geometry column into a GeoDataFrame"""
+    geometry = decode_geometry(table.column(geometry_column))
+    attributes = table.drop([geometry_column]).to_pandas()
+    return gpd.GeoDataFrame(attributes, geometry=geometry, crs=crs)
+
+
+###############################################
+## STREAMING
+###############################################
+
+def query_batches(client, query, page_size=BATCH_ROWS, bqstorage_client=None):
+    """(total rows, iterator of arrow record batches) for a query, without materializing the result"""
+    rows = client.query(query).result(page_size=page_size)
+    if not rows.total_rows:
+        # no pages to stream: one empty batch with the RowIterator's schema, so an empty result
+        # still writes an (empty) table
+        schema = rows.to_arrow(create_bqstorage_client=False).schema
+        return 0, iter([pa.RecordBatch.from_pylist([], schema=schema)])
+    return rows.total_rows, rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+
+
+def track_progress(batches, total, progress=None):
+    """pass batches through, calling progress(rows done, total rows) after each"""
+    done = 0
+    for batch in batches:
+        done += batch.num_rows
+        yield batch
+        if progress is not None:
+            progress(done, total)
+
+
+def geoparquet_schema(schema, column='geometry', crs="EPSG:4326"):
+    """attach GeoParquet 'geo' metadata for a WKB column"""
+    geo = {
+        'version': '1.0.0',
+        'primary_column': column,
+        'columns': {column: {'encoding': 'WKB', 'geometry_types': [], 'crs': pyproj.CRS(crs).to_json_dict()}},
+    }
+    return schema.with_metadata({**(schema.metadata or {}), b'geo': json.dumps(geo).encode()})
+
+
+def to_geoparquet_batch(batch):
+    """rename the WKB column to geometry and drop the repair flag; decoding is left to the (vectorized) read side"""
+    keep = [i for i, f in enumerate(batch.schema) if f.name != REPAIRED_COLUMN]
+    fields = [batch.schema.field(i) for i in keep]
+    fields = [pa.field('geometry' if f.name == GEOMETRY_COLUMN else f.name, f.type) for f in fields]
+    return pa.RecordBatch.from_arrays([batch.column(i) for i in keep], schema=geoparquet_schema(pa.schema(fields)))
+
+
+def stream_table(client, query, store, version, name, transform=None, progress=None, geo=False, bqstorage_client=None):
+    """stream a query result into the snapshot store, transforming each batch on the way"""
+    total, batches = query_batches(client, query, bqstorage_client=bqstorage_client)
+    batches = track_progress(batches, total, progress)
+    if transform is not None:
+        batches = (transform(batch) for batch in batches)
+    store.write_batches(version, name, batches, geo=geo)
+
+
+def stream_boundary_level(client, level, store, version, progress=None, bqstorage_client=None):
+    """
+    stream one boundary level into the snapshot store as GeoParquet; returns (and logs)
+    how many geometries were planar-invalid and repaired by make_valid
+    """
+    repaired = 0
+
+    def transform(batch):
+        nonlocal repaired
+        if REPAIRED_COLUMN in batch.schema.names:
+            repaired += pc.sum(batch.column(REPAIRED_COLUMN).cast(pa.int64())).as_py() or 0
+        return to_geoparquet_batch(batch)
+
+    stream_table(client, boundary_query(level), store, version, level, transform=transform,
+                 progress=progress, geo=True, bqstorage_client=bqstorage_client)
+    if repaired:
+        log.warning("%s: %d geometries were invalid and repaired by make_valid (rings may have changed)", level, repaired)
+    return repaired
+
+
+###############################################
+## LOCAL FIXTURES
+###############################################
+
+def write_fixture(gdf, path, row_group_size=1024):
+    """write a boundary frame as parquet with a WKB column, the same layout BigQuery returns"""
+    table = pa.Table.from_pandas(gdf.drop(columns=gdf.geometry.name), preserve_index=False)
+    wkb = pa.array(shapely.to_wkb(gdf.geometry.values), type=pa.binary())
+    table = table.append_column(GEOMETRY_COLUMN, wkb)
+    pq.write_table(table, path, row_group_size=row_group_size)
+
+
+def read_fixture(path, crs="EPSG:4326"):
+    """read a fixture written by write_fixture through the same decode path"""
+    return arrow_to_gdf(pq.read_table(path, memory_map=True), crs=crs)
@@ -0,0 +1,41 @@
+"""
+Level-of-detail pyramids for the admin boundary layers.
+
+Each level is simplified at a few tolerances with coverage simplification, which
+simplifies every shared border once so neighbouring polygons stay aligned. The
+map then draws the coarsest LOD whose error is below about a pixel at the
+requested zoom. All LODs keep the row order of the boundary frame.
+"""
+import numpy as np
+import shapely
+
+# simplification tolerances in degrees; LOD 0 is the full-resolution geometry
+TOLERANCES = (0.0, 0.0025, 0.01, 0.04, 0.16)
+
+
+def simplify_coverage(geometry, tolerance):
+    """topology-preserving simplification of a polygon coverage"""
+    geometry = np.asarray(geometry)
+    if tolerance <= 0:
+        return geometry
+    # shapely >= 2.1 / GEOS >= 3.12: shared edges are simplified once for both neighbours
+    return shapely.coverage_simplify(geometry, tolerance)
+
+
+def build_pyramid(geometry, tolerances=TOLERANCES):
+    """one geometry array per tolerance, each aligned to the input rows"""
+    return [simplify_coverage(geometry, t) for t in tolerances]
+
+
+def pixel_size(zoom):
+    """width of one 256px web-mercator tile pixel in degrees at `zoom`"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def pick_lod(zoom, tolerances=TOLERANCES, max_error_px=1.0):
+    """index of the coarsest LOD whose tolerance stays under `max_error_px` pixels at `zoom`"""
+    limit = max_error_px * pixel_size(zoom)
+    fitting = [i for i, t in enumerate(tolerances) if t <= limit]
+    if not fitting:
+        return int(np.argmin(tolerances))
+    return max(fitting, key=lambda i: tolerances[i])
@@ -1,9 +1,12 @@
-import ee
 import geemap.foliumap as geemap
-import geemap.colormaps as cm
 import geopandas as gpd
 import streamlit as st
 
+import country_index
+import dataset_registry as registry
+import ee_tiles
+from result_cache import cache, uploaded_file_key
+
 st.set_page_config(layout="wide")
 
 # Customize the sidebar
@@ -31,7 +34,7 @@ st.sidebar.info(
 st.title("Visualizing Global Surface Water Datasets")
 
 
-@st.cache
+@cache.memoize(ttl=3600, key=uploaded_file_key)
 def uploaded_file_to_gdf(data):
     import tempfile
     import os
@@ -67,9 +70,9 @@ col1, col2 = st.columns([4, 1])
 
 Map = geemap.Map(Draw_export=True, locate_control=True, plugin_LatLngPopup=True)
 
-roi = ee.FeatureCollection("users/giswqs/public/countries")
-countries = roi.aggregate_array("name").getInfo()
-countries.sort()
+roi = registry.countries()
+index = country_index.get_index()
+countries = index.names()
 basemaps = list(geemap.basemaps.keys())
 
 with col2:
@@ -95,7 +98,8 @@ with col2:
             countries,
             index=countries.index("United States of America"),
         )
-        st.session_state["ROI"] = roi.filter(ee.Filter.eq("name", country))
+        roi_key = ("country", country)
+        st.session_state["ROI"] = registry.country_roi(country)
     else:
 
         with st.expander("Click here to upload an ROI", False):
@@ -105,23 +109,17 @@ with col2:
             )
 
             if upload:
-                gdf = uploaded_file_to_gdf(upload)
-                st.session_state["ROI"] = geemap.gdf_to_ee(gdf, geodesic=False)
+                roi_key = ("upload",) + uploaded_file_key(upload)
+                st.session_state["ROI"] = registry.region(
+                    roi_key,
+                    lambda: geemap.gdf_to_ee(uploaded_file_to_gdf(upload), geodesic=False),
+                )
                 # Map.add_gdf(gdf, "ROI")
             else:
+                roi_key = ("world",)
                 st.session_state["ROI"] = roi
 
-    datasets = [
-        "JRC Max Water Extent (1984-2020)",
-        "JRC Water Occurrence (1984-2020)",
-        "Dynamic World 2020",
-        "ESA Global Land Cover 2020",
-        "ESRI Global Land Cover 2020",
-        "OpenStreetMap Water Layer",
-        "Global River Width (GRWL)",
-        "Global floodplains (GFPLAIN250m)",
-        "HydroLAKES",
-    ]
+    datasets = registry.MAP_DATASETS
 
     dataset = st.selectbox("Select a water dataset", datasets)
 
@@ -133,379 +131,33 @@ with col2:
     split = st.checkbox("Use split-panel map")
     add_legend = st.checkbox("Add legend", True)
 
-    if dataset == "JRC Max Water Extent (1984-2020)":
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        image = (
-            ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("max_extent").selfMask()
-        )
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-            legend_dict = {"Water": vis_params["palette"][0]}
-            Map.add_legend(title="JRC Water", legend_dict=legend_dict)
-
-    elif dataset == "JRC Water Occurrence (1984-2020)":
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            "{'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']}",
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        image = ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("occurrence")
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        Map.add_colorbar(vis_params, label="Water occurrence (%)")
-
-    elif dataset == "Dynamic World 2020":
-        start_date = "2020-01-01"
-        end_date = "2021-01-01"
-
-        if st.session_state["ROI"] is not None:
-            region = st.session_state["ROI"]
-        else:
-            region = ee.Geometry.BBox(-179, -89, 179, 89)
-
-        if water_only:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="class"
-            )
-
-            image = image.eq(0).selfMask()
-
-            params = params_input.text_area(
-                "Enter vis params as a dictionary",
-                "{'min': 1, 'max': 1, 'palette': ['419BDF']}",
-            )
-
-            try:
-                vis_params = eval(params)
-            except Exception as e:
-                st.error(e)
-                st.error("Invalid vis params")
-                vis_params = {}
-
-        else:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="hillshade"
-            )
-            vis_params = {}
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-
-            if water_only:
-                legend_dict = {"Water": vis_params["palette"][0]}
-                Map.add_legend(title="Legend", legend_dict=legend_dict)
-            else:
-                Map.add_legend(
-                    title="Dynamic World Land Cover", builtin_legend="Dynamic_World"
-                )
-
-    elif dataset == "ESA Global Land Cover 2020":
-        image = ee.ImageCollection("ESA/WorldCover/v100").first()
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        if water_only:
-            image = image.eq(80).selfMask()
-
-            params = params_input.text_area(
-                "Enter vis params as a dictionary",
-                "{'min': 1, 'max': 1, 'palette': ['0064c8']}",
-            )
-
-            try:
-                vis_params = eval(params)
-            except Exception as e:
-                st.error(e)
-                st.error("Invalid vis params")
-                vis_params = {}
-        else:
-            vis_params = {
-                "bands": ["Map"],
-            }
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-
-            if water_only:
-                legend_dict = {"Water": vis_params["palette"][0]}
-                Map.add_legend(title="Legend", legend_dict=legend_dict)
-            else:
-                Map.add_legend(title="ESA Land Cover", builtin_legend="ESA_WorldCover")
-
-    elif dataset == "ESRI Global Land Cover 2020":
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/landcover/ESRI_Global-LULC_10m"
-        ).mosaic()
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        if water_only:
-            image = image.eq(1).selfMask()
-
-            esri_vis = {"min": 1, "max": 1, "palette": ["#1A5BAB"]}
-
-        else:
-            esri_vis = {
-                "min": 1,
-                "max": 10,
-                "palette": [
-                    "#1A5BAB",
-                    "#358221",
-                    "#A7D282",
-                    "#87D19E",
-                    "#FFDB5C",
-                    "#EECFA8",
-                    "#ED022A",
-                    "#EDE9E4",
-                    "#F2FAFF",
-                    "#C8C8C8",
-                ],
-            }
-
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            str(esri_vis),
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-
-            if water_only:
-                legend_dict = {"Water": vis_params["palette"][0]}
-                Map.add_legend(title="Legend", legend_dict=legend_dict)
-            else:
-                Map.add_legend(title="ESRI Land Cover", builtin_legend="ESRI_LandCover")
-    elif dataset == "OpenStreetMap Water Layer":
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/OSM_waterLayer"
-        ).mosaic()
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        vis = {
-            "min": 1,
-            "max": 5,
-            "palette": ["08306b", "08519c", "2171b5", "4292c6", "6baed6"],
-        }
-
-        legend_dict = {
-            "Ocean": "08306b",
-            "Large Lake/River": "08519c",
-            "Major River": "2171b5",
-            "Canal": "4292c6",
-            "Small Stream": "6baed6",
-        }
-
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            str(vis),
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-
-            Map.add_legend(title="OSM Water Layer", legend_dict=legend_dict)
-    elif dataset == "Global River Width (GRWL)":
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/GRWL/water_mask_v01_01"
-        ).mosaic()
-
-        vector = ee.FeatureCollection(
-            "projects/sat-io/open-datasets/GRWL/water_vector_v01_01"
-        )
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-            vector = vector.filterBounds(st.session_state["ROI"])
-
-        vis = {
-            "min": 255,
-            "max": 255,
-            "palette": [
-                "#0000ff",
-            ],
-        }
-
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            str(vis),
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        Map.addLayer(
-            vector.style(**{"fillColor": "00000000", "color": "FF5500"}),
-            {},
-            "GRWL Vector",
-        )
-
-        if add_legend:
-
-            legend_dict = {
-                "Water": vis_params["palette"][0],
-                "River Centerline": "#FF5500",
-            }
-            Map.add_legend(title="Global River Width", legend_dict=legend_dict)
-
-    elif dataset == "Global floodplains (GFPLAIN250m)":
-        image = ee.ImageCollection("projects/sat-io/open-datasets/GFPLAIN250").mosaic()
-
-        if st.session_state["ROI"] is not None:
-            image = image.clip(st.session_state["ROI"])
-
-        vis = {
-            "palette": [
-                "#0000ff",
-            ],
-        }
-
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            str(vis),
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        if split:
-            layer = geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(image, vis_params, dataset, True, opacity)
-
-        if add_legend:
-
-            legend_dict = {
-                "Water": vis_params["palette"][0],
-            }
-            Map.add_legend(title="Global floodplains", legend_dict=legend_dict)
-
-    elif dataset == "HydroLAKES":
-        vector = ee.FeatureCollection(
-            "projects/sat-io/open-datasets/HydroLakes/lake_poly_v10"
-        )
-
-        if st.session_state["ROI"] is not None:
-            vector = vector.filterBounds(st.session_state["ROI"])
-
-        vis = {
-            "color": "#00008B",
-        }
-
-        params = params_input.text_area(
-            "Enter vis params as a dictionary",
-            str(vis),
-        )
-
-        try:
-            vis_params = eval(params)
-        except Exception as e:
-            st.error(e)
-            st.error("Invalid vis params")
-            vis_params = {}
-
-        if split:
-            layer = geemap.ee_tile_layer(vector, vis_params, dataset, True, opacity)
-            Map.split_map(layer, layer)
-        else:
-            Map.add_layer(vector, vis_params, dataset, True, opacity)
+    region = st.session_state["ROI"]
+    params = params_input.text_area(
+        "Enter vis params as a dictionary",
+        registry.get(dataset).vis_text(water_only),
+    )
+
+    try:
+        vis_params = eval(params)
+    except Exception as e:
+        st.error(e)
+        st.error("Invalid vis params")
+        vis_params = {}
+
+    # the same memoized expression on every rerun and on every page
+    image = registry.layer(dataset, water_only, region, roi_key)
+
+    if split:
+        layer = ee_tiles.ee_tile_layer(image, vis_params, dataset, True, opacity)
+        Map.split_map(layer, layer)
+    else:
+        ee_tiles.add_layer(Map, image, vis_params, dataset, True, opacity)
 
-        if add_legend:
+    for overlay, overlay_vis, overlay_name in registry.overlays(dataset, region, roi_key):
+        ee_tiles.add_layer(Map, overlay, overlay_vis, overlay_name)
 
-            legend_dict = {
-                "Lake": vis_params["color"],
-            }
-            Map.add_legend(title="HydroLAKES", legend_dict=legend_dict)
+    if add_legend or registry.get(dataset).colorbar:
+        registry.add_legend(Map, dataset, vis_params, water_only)
 
 
 style = {
@@ -519,24 +171,29 @@ style = {
 show = False
 if select and country is not None:
     name = country
+    outline, bounds = index.outline(country), index.bounds(country)
     style["color"] = "#000000"
     style["width"] = 2
     show = True
 elif upload:
     name = "ROI"
+    outline = uploaded_file_to_gdf(upload)
+    bounds = country_index.gdf_bounds(outline)
     style["color"] = "#FFFF00"
     style["width"] = 2
     show = True
 else:
     name = "World"
+    outline, bounds = index.outline(tolerance=0.05), index.bounds()
 
-Map.addLayer(st.session_state["ROI"].style(**style), {}, name, show)
-Map.centerObject(st.session_state["ROI"])
+# outline and extent come from the local country index, not from Earth Engine
+country_index.outline_layer(outline, name, style["color"], style["width"], show).add_to(Map)
+Map.fit_bounds(bounds)
 
 with col1:
 
     if select:
-        Map.centerObject(st.session_state["ROI"])
+        Map.fit_bounds(bounds)
     else:
         Map.set_center(longitude, latitude, zoom)
     Map.to_streamlit(height=680)
@@ -1,9 +1,12 @@
-import ee
 import geemap.foliumap as geemap
-import geemap.colormaps as cm
 import geopandas as gpd
 import streamlit as st
 
+import country_index
+import dataset_registry as registry
+import ee_tiles
+from result_cache import cache, uploaded_file_key
+
 st.set_page_config(layout="wide")
 geemap.ee_initialize()
 
@@ -31,32 +34,11 @@ st.sidebar.info(
 
 st.title("Comparing Global Surface Water Datasets")
 
-default_vis = {
-    "JRC Max Water Extent (1984-2020)": "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-    "JRC Water Occurrence (1984-2020)": "{'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']}",
-    "Dynamic World 2020": "{}",
-    "ESA Global Land Cover 2020": '{"bands": ["Map"]}',
-    "ESRI Global Land Cover 2020": "{'min': 1, 'max': 10, 'palette': ['1A5BAB', '358221', 'A7D282', '87D19E', 'FFDB5C', 'EECFA8', 'ED022A', 'EDE9E4', 'F2FAFF', 'C8C8C8']}",
-    "OpenStreetMap Water Layer": "{'min': 1, 'max': 1, 'palette': ['08306b', '08519c', '2171b5', '4292c6', '6baed6']}",
-    "Global River Width (GRWL)": "{'min': 255, 'max': 255, 'palette': ['0000ff']}",
-    "Global floodplains (GFPLAIN250m)": "{'palette': ['0000ff']}",
-    "HydroLAKES": "{'color': '00008B'}",
-}
+default_vis = {name: d.vis_text(False) for name, d in registry.DATASETS.items()}
+water_vis = {name: d.vis_text(True) for name, d in registry.DATASETS.items()}
 
-water_vis = {
-    "JRC Max Water Extent (1984-2020)": "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-    "JRC Water Occurrence (1984-2020)": "{'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']}",
-    "Dynamic World 2020": "{'min': 1, 'max': 1, 'palette': ['419BDF']}",
-    "ESA Global Land Cover 2020": "{'min': 1, 'max': 1, 'palette': ['0064c8']}",
-    "ESRI Global Land Cover 2020": '{"min": 1, "max": 1, "palette": ["1A5BAB"]}',
-    "OpenStreetMap Water Layer": "{'min': 1, 'max': 1, 'palette': ['08306b', '08519c', '2171b5', '4292c6', '6baed6']}",
-    "Global River Width (GRWL)": "{'min': 255, 'max': 255, 'palette': ['0000ff']}",
-    "Global floodplains (GFPLAIN250m)": "{'palette': ['0000ff']}",
-    "HydroLAKES": "{'color': '00008B'}",
-}
 
-
-@st.cache
+@cache.memoize(ttl=3600, key=uploaded_file_key)
 def uploaded_file_to_gdf(data):
     import tempfile
     import os
@@ -78,7 +60,7 @@ def uploaded_file_to_gdf(data):
     return gdf
 
 
-def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0):
+def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0, roi_key=None):
 
     if isinstance(vis_params, str):
         try:
@@ -93,106 +75,8 @@ def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0):
         st.error("Invalid vis params")
         vis_params = {}
 
-    if dataset == "JRC Max Water Extent (1984-2020)":
-
-        image = (
-            ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("max_extent").selfMask()
-        )
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "JRC Water Occurrence (1984-2020)":
-        image = ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("occurrence")
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "Dynamic World 2020":
-        start_date = "2020-01-01"
-        end_date = "2021-01-01"
-        if water_only:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="class"
-            )
-
-            image = image.eq(0).selfMask()
-        else:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="hillshade"
-            )
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "ESA Global Land Cover 2020":
-        image = ee.ImageCollection("ESA/WorldCover/v100").first()
-
-        if water_only:
-            image = image.eq(80).selfMask()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "ESRI Global Land Cover 2020":
-
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/landcover/ESRI_Global-LULC_10m"
-        ).mosaic()
-
-        if water_only:
-            image = image.eq(1).selfMask()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "OpenStreetMap Water Layer":
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/OSM_waterLayer"
-        ).mosaic()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "Global River Width (GRWL)":
-
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/GRWL/water_mask_v01_01"
-        ).mosaic()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "Global floodplains (GFPLAIN250m)":
-        image = ee.ImageCollection("projects/sat-io/open-datasets/GFPLAIN250").mosaic()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return geemap.ee_tile_layer(image, vis_params, dataset, True, opacity)
-
-    elif dataset == "HydroLAKES":
-        vector = ee.FeatureCollection(
-            "projects/sat-io/open-datasets/HydroLakes/lake_poly_v10"
-        )
-
-        if region is not None:
-            vector = vector.filterBounds(region)
-
-        return geemap.ee_tile_layer(vector, vis_params, dataset, True, opacity)
+    image = registry.layer(dataset, water_only, region, roi_key)
+    return ee_tiles.ee_tile_layer(image, vis_params, dataset, True, opacity)
 
 
 with st.expander("How to use this app"):
@@ -209,9 +93,9 @@ col1, col2 = st.columns([4, 1])
 
 Map = geemap.Map(Draw_export=True, locate_control=True, plugin_LatLngPopup=True)
 
-roi = ee.FeatureCollection("users/giswqs/public/countries")
-countries = roi.aggregate_array("name").getInfo()
-countries.sort()
+roi = registry.countries()
+index = country_index.get_index()
+countries = index.names()
 basemaps = list(geemap.basemaps.keys())
 
 with col2:
@@ -238,7 +122,8 @@ with col2:
             countries,
             index=countries.index("United States of America"),
         )
-        st.session_state["ROI"] = roi.filter(ee.Filter.eq("name", country))
+        roi_key = ("country", country)
+        st.session_state["ROI"] = registry.country_roi(country)
     else:
 
         with st.expander("Click here to upload an ROI", False):
@@ -248,23 +133,17 @@ with col2:
             )
 
             if upload:
-                gdf = uploaded_file_to_gdf(upload)
-                st.session_state["ROI"] = geemap.gdf_to_ee(gdf, geodesic=False)
+                roi_key = ("upload",) + uploaded_file_key(upload)
+                st.session_state["ROI"] = registry.region(
+                    roi_key,
+                    lambda: geemap.gdf_to_ee(uploaded_file_to_gdf(upload), geodesic=False),
+                )
                 # Map.add_gdf(gdf, "ROI")
             else:
+                roi_key = ("world",)
                 st.session_state["ROI"] = roi
 
-    datasets = [
-        "JRC Max Water Extent (1984-2020)",
-        "JRC Water Occurrence (1984-2020)",
-        "Dynamic World 2020",
-        "ESA Global Land Cover 2020",
-        "ESRI Global Land Cover 2020",
-        "OpenStreetMap Water Layer",
-        "Global River Width (GRWL)",
-        "Global floodplains (GFPLAIN250m)",
-        "HydroLAKES",
-    ]
+    datasets = registry.MAP_DATASETS
 
     water_only = st.checkbox("Show water class only", True)
     # add_legend = st.checkbox("Add legend", True)
@@ -295,11 +174,11 @@ with col2:
         )
 
     left_layer = get_layer(
-        left_dataset, left_params, water_only, st.session_state["ROI"]
+        left_dataset, left_params, water_only, st.session_state["ROI"], roi_key=roi_key
     )
 
     right_layer = get_layer(
-        right_dataset, right_params, water_only, st.session_state["ROI"]
+        right_dataset, right_params, water_only, st.session_state["ROI"], roi_key=roi_key
     )
 
     Map.split_map(left_layer, right_layer)
@@ -315,24 +194,29 @@ style = {
 show = False
 if select and country is not None:
     name = country
+    outline, bounds = index.outline(country), index.bounds(country)
     style["color"] = "#000000"
     style["width"] = 2
     show = True
 elif upload:
     name = "ROI"
+    outline = uploaded_file_to_gdf(upload)
+    bounds = country_index.gdf_bounds(outline)
     style["color"] = "#FFFF00"
     style["width"] = 2
     show = True
 else:
     name = "World"
+    outline, bounds = index.outline(tolerance=0.05), index.bounds()
 
-Map.addLayer(st.session_state["ROI"].style(**style), {}, name, show)
-Map.centerObject(st.session_state["ROI"])
+# outline and extent come from the local country index, not from Earth Engine
+country_index.outline_layer(outline, name, style["color"], style["width"], show).add_to(Map)
+Map.fit_bounds(bounds)
 
 with col1:
 
     if select:
-        Map.centerObject(st.session_state["ROI"])
+        Map.fit_bounds(bounds)
     else:
         Map.set_center(longitude, latitude, zoom)
     Map.to_streamlit(height=680)
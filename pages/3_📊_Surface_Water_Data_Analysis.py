@@ -1,12 +1,17 @@
-import ee
 import geemap.foliumap as geemap
-import geemap.colormaps as cm
 import geopandas as gpd
 import streamlit as st
 import plotly.express as px
-import pandas as pd
 import leafmap
 
+import country_index
+import dataset_registry as registry
+import analysis_pool
+import area_stats
+import ee_tiles
+import water_history
+from result_cache import cache, uploaded_file_key
+
 st.set_page_config(layout="wide")
 geemap.ee_initialize()
 
@@ -34,34 +39,11 @@ st.sidebar.info(
 
 st.title("Analyzing Global Surface Water Datasets")
 
-default_vis = {
-    "JRC Max Water Extent (1984-2020)": "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-    "JRC Water Occurrence (1984-2020)": "{'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']}",
-    "JRC Monthly Water History (1984-2020)": "{'min': 0, 'max': 2, 'palette': ['ffffff', 'fffcb8', '0905ff']}",
-    "Dynamic World 2020": "{}",
-    "ESA Global Land Cover 2020": '{"bands": ["Map"]}',
-    "ESRI Global Land Cover 2020": "{'min': 1, 'max': 10, 'palette': ['1A5BAB', '358221', 'A7D282', '87D19E', 'FFDB5C', 'EECFA8', 'ED022A', 'EDE9E4', 'F2FAFF', 'C8C8C8']}",
-    "OpenStreetMap Water Layer": "{'min': 1, 'max': 1, 'palette': ['08306b', '08519c', '2171b5', '4292c6', '6baed6']}",
-    "Global River Width (GRWL)": "{'min': 255, 'max': 255, 'palette': ['0000ff']}",
-    "Global floodplains (GFPLAIN250m)": "{'palette': ['0000ff']}",
-    "HydroLAKES": "{'color': '00008B'}",
-}
-
-water_vis = {
-    "JRC Max Water Extent (1984-2020)": "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-    "JRC Water Occurrence (1984-2020)": "{'min': 0, 'max': 100, 'palette': ['ffffff', 'ffbbbb', '0000ff']}",
-    "JRC Monthly Water History (1984-2020)": "{'min': 1, 'max': 1, 'palette': ['0000ff']}",
-    "Dynamic World 2020": "{'min': 1, 'max': 1, 'palette': ['419BDF']}",
-    "ESA Global Land Cover 2020": "{'min': 1, 'max': 1, 'palette': ['0064c8']}",
-    "ESRI Global Land Cover 2020": '{"min": 1, "max": 1, "palette": ["1A5BAB"]}',
-    "OpenStreetMap Water Layer": "{'min': 1, 'max': 1, 'palette': ['08306b', '08519c', '2171b5', '4292c6', '6baed6']}",
-    "Global River Width (GRWL)": "{'min': 255, 'max': 255, 'palette': ['0000ff']}",
-    "Global floodplains (GFPLAIN250m)": "{'palette': ['0000ff']}",
-    "HydroLAKES": "{'color': '00008B'}",
-}
+default_vis = {name: d.vis_text(False) for name, d in registry.DATASETS.items()}
+water_vis = {name: d.vis_text(True) for name, d in registry.DATASETS.items()}
 
 
-# @st.cache
+@cache.memoize(ttl=3600, key=uploaded_file_key)
 def uploaded_file_to_gdf(data):
     import tempfile
     import os
@@ -83,7 +65,7 @@ def uploaded_file_to_gdf(data):
     return gdf
 
 
-def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0):
+def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0, roi_key=None):
 
     if isinstance(vis_params, str):
         try:
@@ -98,118 +80,26 @@ def get_layer(dataset, vis_params, water_only, region=None, opacity=1.0):
         st.error("Invalid vis params")
         vis_params = {}
 
-    if dataset == "JRC Max Water Extent (1984-2020)":
-
-        image = (
-            ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("max_extent").selfMask()
-        )
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-    elif dataset == "JRC Water Occurrence (1984-2020)":
-        image = ee.Image("JRC/GSW1_3/GlobalSurfaceWater").select("occurrence")
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "JRC Monthly Water History (1984-2020)":
-        image = (
-            ee.ImageCollection("JRC/GSW1_3/MonthlyHistory")
-            .map(lambda img: img.eq(2).selfMask())
-            .max()
-            .selfMask()
-        )
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "Dynamic World 2020":
-        start_date = "2020-01-01"
-        end_date = "2021-01-01"
-        if water_only:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="class"
-            )
-
-            image = image.eq(0).selfMask()
-        else:
-            image = geemap.dynamic_world(
-                region, start_date, end_date, return_type="hillshade"
-            )
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "ESA Global Land Cover 2020":
-        image = ee.ImageCollection("ESA/WorldCover/v100").first()
-
-        if water_only:
-            image = image.eq(80).selfMask()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "ESRI Global Land Cover 2020":
-
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/landcover/ESRI_Global-LULC_10m"
-        ).mosaic()
-
-        if water_only:
-            image = image.eq(1).selfMask()
-
-        if region is not None:
-            image = image.clip(region)
+    return registry.layer(dataset, water_only, region, roi_key)
 
-        return image
 
-    elif dataset == "OpenStreetMap Water Layer":
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/OSM_waterLayer"
-        ).mosaic()
+# analysis jobs run on worker threads: no st.* calls inside, results are rendered by the script;
+# monthly areas are kept per (dataset, ROI, month, scale), so only months not computed before hit Earth Engine
+def monthly_area_job(region, start_date, end_date, start_month, end_month, scale, reducer):
+    def job(report):
+        series = None
+        for series in water_history.monthly_series(
+            region, start_date, end_date, start_month, end_month, scale, reducer
+        ):
+            report(series)
+        return series
 
-        if region is not None:
-            image = image.clip(region)
+    return job
 
-        return image
 
-    elif dataset == "Global River Width (GRWL)":
-
-        image = ee.ImageCollection(
-            "projects/sat-io/open-datasets/GRWL/water_mask_v01_01"
-        ).mosaic()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "Global floodplains (GFPLAIN250m)":
-        image = ee.ImageCollection("projects/sat-io/open-datasets/GFPLAIN250").mosaic()
-
-        if region is not None:
-            image = image.clip(region)
-
-        return image
-
-    elif dataset == "HydroLAKES":
-        vector = ee.FeatureCollection(
-            "projects/sat-io/open-datasets/HydroLakes/lake_poly_v10"
-        )
-
-        if region is not None:
-            vector = vector.filterBounds(region)
-
-        return vector
+def area_by_group_job(layer, region, scale):
+    # the static layers do not depend on the date range: answered from the cache after the first run
+    return lambda report: area_stats.image_area_by_group(layer, region, scale)
 
 
 with st.expander("How to use this app"):
@@ -226,9 +116,9 @@ col1, col2 = st.columns([3.2, 1])
 
 Map = geemap.Map(Draw_export=True, locate_control=True, plugin_LatLngPopup=True)
 
-roi = ee.FeatureCollection("users/giswqs/public/countries")
-countries = roi.aggregate_array("name").getInfo()
-countries.sort()
+roi = registry.countries()
+index = country_index.get_index()
+countries = index.names()
 basemaps = list(geemap.basemaps.keys())
 
 with col2:
@@ -255,7 +145,8 @@ with col2:
             countries,
             index=countries.index("United States of America"),
         )
-        st.session_state["ROI"] = roi.filter(ee.Filter.eq("name", country))
+        roi_key = ("country", country)
+        st.session_state["ROI"] = registry.country_roi(country)
     else:
 
         with st.expander("Click here to upload an ROI", False):
@@ -265,24 +156,17 @@ with col2:
             )
 
             if upload:
-                gdf = uploaded_file_to_gdf(upload)
-                st.session_state["ROI"] = geemap.gdf_to_ee(gdf, geodesic=False)
+                roi_key = ("upload",) + uploaded_file_key(upload)
+                st.session_state["ROI"] = registry.region(
+                    roi_key,
+                    lambda: geemap.gdf_to_ee(uploaded_file_to_gdf(upload), geodesic=False),
+                )
                 # Map.add_gdf(gdf, "ROI")
             else:
+                roi_key = ("world",)
                 st.session_state["ROI"] = roi
 
-    options = [
-        "JRC Max Water Extent (1984-2020)",
-        "JRC Water Occurrence (1984-2020)",
-        "JRC Monthly Water History (1984-2020)",
-        "Dynamic World 2020",
-        "ESA Global Land Cover 2020",
-        "ESRI Global Land Cover 2020",
-        "OpenStreetMap Water Layer",
-        "Global River Width (GRWL)",
-        "Global floodplains (GFPLAIN250m)",
-        "HydroLAKES",
-    ]
+    options = registry.ANALYSIS_DATASETS
 
     with st.expander("Set params for filtering data"):
         years = st.slider("Select the year range", 1984, 2022, (1984, 2021))
@@ -360,24 +244,29 @@ style = {
 show = False
 if select and country is not None:
     name = country
+    outline, bounds = index.outline(country), index.bounds(country)
     style["color"] = "#FFFF00"
     style["width"] = 2
     show = True
 elif upload:
     name = "ROI"
+    outline = uploaded_file_to_gdf(upload)
+    bounds = country_index.gdf_bounds(outline)
     style["color"] = "#FFFF00"
     style["width"] = 2
     show = True
 else:
     name = "World"
+    outline, bounds = index.outline(tolerance=0.05), index.bounds()
 
-Map.addLayer(st.session_state["ROI"].style(**style), {}, name, show)
-Map.centerObject(st.session_state["ROI"])
+# outline and extent come from the local country index, not from Earth Engine
+country_index.outline_layer(outline, name, style["color"], style["width"], show).add_to(Map)
+Map.fit_bounds(bounds)
 
 with col1:
 
     if select or upload:
-        Map.centerObject(st.session_state["ROI"])
+        Map.fit_bounds(bounds)
     else:
         Map.set_center(longitude, latitude, zoom)
 
@@ -388,19 +277,15 @@ with col1:
             if dataset != "JRC Monthly Water History (1984-2020)":
 
                 layer = get_layer(
-                    dataset, vis_params, water_only, st.session_state["ROI"]
+                    dataset, vis_params, water_only, st.session_state["ROI"], roi_key=roi_key
                 )
             else:
-                layer = (
-                    ee.ImageCollection("JRC/GSW1_3/MonthlyHistory")
-                    .filterDate(start_date, end_date)
-                    .filter(ee.Filter.calendarRange(start_month, end_month, "month"))
-                    .map(lambda img: img.eq(2).selfMask())
-                    .max()
-                )
+                layer = water_history.monthly_water(
+                    start_date, end_date, start_month, end_month
+                ).max()
                 if st.session_state["ROI"] is not None:
                     layer = layer.clip(st.session_state["ROI"])
-            Map.addLayer(layer, vis_params, dataset)
+            ee_tiles.add_layer(Map, layer, vis_params, dataset)
 
     Map.to_streamlit(height=680)
 
@@ -427,83 +312,52 @@ if submitted:
     # with col2:
     #     empty.text("Computing...")
 
+    # every selected dataset is submitted at once; panels fill in as their job finishes
+    region = st.session_state["ROI"]
+    jobs, panels = {}, {}
     for dataset in datasets:
-        # vis_params = eval(vis_options[dataset])
-        # layer = get_layer(dataset, vis_params, water_only, st.session_state["ROI"])
-        # Map.addLayer(layer, vis_params, dataset)
-
-        # if select or upload:
         with col2:
-            region = st.session_state["ROI"]
-            empty = st.empty()
-            empty.text("Computing...")
-
-            if dataset == "JRC Monthly Water History (1984-2020)":
-                images = (
-                    ee.ImageCollection("JRC/GSW1_3/MonthlyHistory")
-                    .filterDate(start_date, end_date)
-                    .filter(ee.Filter.calendarRange(start_month, end_month, "month"))
-                    .map(lambda img: img.eq(2).selfMask())
-                )
-
-                def cal_area(img):
-                    pixel_area = img.multiply(ee.Image.pixelArea()).divide(1e4)
-                    img_area = pixel_area.reduceRegion(
-                        **{
-                            "geometry": region,
-                            "reducer": ee.Reducer.sum(),
-                            "scale": scale,
-                            "maxPixels": 1e12,
-                            "bestEffort": True,
-                        }
-                    )
-                    return img.set({"area": img_area})
-
-                areas = images.map(cal_area)
-                stats = areas.aggregate_array("area").getInfo()
-                values = [item["water"] for item in stats]
-                labels = areas.aggregate_array("system:index").getInfo()
-                dates = [d[:4] for d in labels]
-                data_dict = {"Date": labels, "Year": dates, "Area (ha)": values}
-                df = pd.DataFrame(data_dict)
-                result = df.groupby("Year").agg(reducer)
-                df2 = pd.DataFrame(
-                    {"Year": result.index, "Area (ha)": result["Area (ha)"]}
-                )
-                df2 = df2.reset_index(drop=True)
-
-                # fig = px.scatter(result, x="Year", y="Area (ha)", trendline="ols")
-                fig = px.bar(df2, x="Year", y="Area (ha)")
-                # with col2:
-                empty.plotly_chart(fig)
-
-                with st.expander("Statistics"):
+            panel = st.container()
+            chart = panel.empty()
+            chart.text(f"Computing {dataset}...")
+            panels[dataset] = panel, chart
+
+        if dataset == "JRC Monthly Water History (1984-2020)":
+            # one request per chunk of years; the chart grows as chunks arrive
+            jobs[dataset] = monthly_area_job(
+                region, start_date, end_date, start_month, end_month, scale, reducer
+            )
+        else:
+            vis_params = eval(vis_options[dataset])
+            layer = get_layer(
+                dataset, vis_params, water_only, region, roi_key=roi_key
+            )
+            ee_tiles.add_layer(Map, layer, vis_params, dataset)
+            jobs[dataset] = area_by_group_job(layer, region, scale)
+
+    for dataset, kind, value in analysis_pool.get_pool().run(jobs):
+        panel, chart = panels[dataset]
+        if kind == "error":
+            chart.error(f"{dataset}: {value}")
+        elif dataset == "JRC Monthly Water History (1984-2020)":
+            if value is None:
+                chart.text("No images in the selected date range")
+                continue
+            df, df2 = value
+            # fig = px.scatter(df2, x="Year", y="Area (ha)", trendline="ols")
+            fig = px.bar(df2, x="Year", y="Area (ha)")
+            chart.plotly_chart(fig)
+
+            if kind == "done":
+                with panel.expander("Statistics"):
                     st.write(df)
                     leafmap.st_download_button("Download data", df)
                     st.write(df2)
                     leafmap.st_download_button("Download data", df2)
-            else:
-                vis_params = eval(vis_options[dataset])
-                layer = get_layer(
-                    dataset, vis_params, water_only, st.session_state["ROI"]
-                )
-                Map.addLayer(layer, vis_params, dataset)
-
-                # if dataset == "JRC Max Water Extent (1984-2020)":
-                df = geemap.image_area_by_group(
-                    layer,
-                    region=region,
-                    scale=scale,
-                    denominator=1e4,
-                    decimal_places=2,
-                    verbose=True,
-                )
-                empty.text("")
+        else:
+            with chart.container():
                 st.write(dataset)
-                st.write(df)
-
-                # with col2:
-                #     st.write(stats)
+                st.write(value)
 
             # with col2:
 
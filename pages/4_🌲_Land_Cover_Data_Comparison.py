@@ -3,6 +3,9 @@ import ee
 import streamlit as st
 import geemap.foliumap as geemap
 
+import dataset_registry as registry
+import ee_tiles
+
 st.set_page_config(layout="wide")
 
 markdown = """
@@ -35,29 +38,16 @@ Map.add_basemap("ESA WorldCover 2020 S2 FCC")
 Map.add_basemap("ESA WorldCover 2020 S2 TCC")
 Map.add_basemap("HYBRID")
 
-esa = ee.ImageCollection("ESA/WorldCover/v100").first()
-esa_vis = {"bands": ["Map"]}
-
-
-esri = ee.ImageCollection(
-    "projects/sat-io/open-datasets/landcover/ESRI_Global-LULC_10m"
-).mosaic()
-esri_vis = {
-    "min": 1,
-    "max": 10,
-    "palette": [
-        "#1A5BAB",
-        "#358221",
-        "#A7D282",
-        "#87D19E",
-        "#FFDB5C",
-        "#EECFA8",
-        "#ED022A",
-        "#EDE9E4",
-        "#F2FAFF",
-        "#C8C8C8",
-    ],
-}
+ESA = "ESA Global Land Cover 2020"
+ESRI = "ESRI Global Land Cover 2020"
+
+
+def dynamic_world(start_date, end_date):
+    region = ee.Geometry.BBox(*registry.WORLD_BBOX)
+    return registry.memoized(
+        ("dynamic_world", start_date, end_date),
+        lambda: geemap.dynamic_world(region, start_date, end_date, return_type="hillshade"),
+    )
 
 
 markdown = """
@@ -81,21 +71,25 @@ with col2:
     start_date = start.strftime("%Y-%m-%d")
     end_date = end.strftime("%Y-%m-%d")
 
-    region = ee.Geometry.BBox(-179, -89, 179, 89)
-    dw = geemap.dynamic_world(region, start_date, end_date, return_type="hillshade")
-
+    # only the two layers on screen are built; their tile URLs come from the cache
     layers = {
-        "Dynamic World": geemap.ee_tile_layer(dw, {}, "Dynamic World Land Cover"),
-        "ESA Land Cover": geemap.ee_tile_layer(esa, esa_vis, "ESA Land Cover"),
-        "ESRI Land Cover": geemap.ee_tile_layer(esri, esri_vis, "ESRI Land Cover"),
+        "Dynamic World": lambda: ee_tiles.ee_tile_layer(
+            dynamic_world(start_date, end_date), {}, "Dynamic World Land Cover"
+        ),
+        "ESA Land Cover": lambda: ee_tiles.ee_tile_layer(
+            registry.layer(ESA), registry.get(ESA).vis(), "ESA Land Cover"
+        ),
+        "ESRI Land Cover": lambda: ee_tiles.ee_tile_layer(
+            registry.layer(ESRI), registry.get(ESRI).vis(), "ESRI Land Cover"
+        ),
     }
 
     options = list(layers.keys())
     left = st.selectbox("Select a left layer", options, index=1)
     right = st.selectbox("Select a right layer", options, index=0)
 
-    left_layer = layers[left]
-    right_layer = layers[right]
+    left_layer = layers[left]()
+    right_layer = layers[right]() if right != left else left_layer
 
     Map.split_map(left_layer, right_layer)
 
@@ -0,0 +1,64 @@
+"""
+Level/topic query pushdown with an on-disk result cache.
+
+Instead of pulling the whole enriched table, one grouped SQL query per level,
+summing every topic at once, is run where the data lives. Results are stored as Parquet
+under a hash of the normalized SQL (namespaced by data version), so each distinct
+query runs once. The same SQL runs on BigQuery or on a local DuckDB stand-in
+that has the table registered under its BigQuery id.
+"""
+import hashlib
+import os
+
+import pyarrow.parquet as pq
+
+import snapshot_store
+
+CACHE_DIR = os.path.join(snapshot_store.SNAPSHOT_DIR, 'queries')
+
+
+def grouped_sql(table, key, topics):
+    """sum the topic columns per unit of one level, in one query"""
+    sums = ', '.join(f"SUM({topic}) AS {topic}" for topic in topics)
+    return f"""
+        SELECT {key}, {sums}
+        FROM `{table}`
+        GROUP BY {key}
+        """
+
+
+def normalize(sql):
+    """collapse whitespace so formatting changes do not miss the cache"""
+    return ' '.join(sql.split())
+
+
+def bigquery_runner(client):
+    # grouped results are small: the REST download beats starting a Storage API session
+    return lambda sql: client.query(sql).result().to_arrow(create_bqstorage_client=False)
+
+
+def duckdb_runner(query_arrow):
+    """run BigQuery-dialect SQL on DuckDB (backtick identifiers become double quotes)"""
+    return lambda sql: query_arrow(sql.replace('`', '"'))
+
+
+class QueryCache:
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, sql, namespace=''):
+        return hashlib.sha256(f"{namespace}\n{normalize(sql)}".encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.parquet")
+
+    def get_or_run(self, sql, runner, namespace=''):
+        """arrow result of `sql`, from disk when this (namespace, query) ran before"""
+        path = self.path(self.key(sql, namespace))
+        if os.path.exists(path):
+            return pq.read_table(path, memory_map=True)
+        table = runner(sql)
+        snapshot_store.atomic_write(path, lambda tmp: pq.write_table(table, tmp))
+        return table
@@ -0,0 +1,152 @@
+"""
+Shared, size-bounded result cache.
+
+A single SQLite file (WAL mode) holds pickled results, so every page, every
+worker process and, with GEOAPP_CACHE_DIR on a shared volume, every replica sees
+the same entries. Entries carry an optional TTL; when the total size passes the
+byte budget the least recently used entries are evicted. Hit and miss counters
+are kept in the same database.
+
+Reads stay off the SQLite write lock: an entry's last-access time is only
+rewritten when it is older than sqlite_store.TOUCH_SECONDS, and hit/miss counts
+are kept in memory and flushed every sqlite_store.FLUSH_EVERY lookups (and by
+set() and stats()).
+
+    from result_cache import cache
+
+    @cache.memoize(ttl=3600)
+    def expensive(x):
+        ...
+"""
+import functools
+import hashlib
+import os
+import pickle
+import time
+
+from sqlite_store import SQLiteStore
+
+CACHE_DIR = os.environ.get('GEOAPP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+MAX_BYTES = int(os.environ.get('GEOAPP_CACHE_MAX_BYTES', 512 * 2**20))
+
+_MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+def _key_part(value):
+    # Earth Engine objects hash by their serialized expression graph
+    if hasattr(value, 'serialize') and callable(value.serialize):
+        return ('ee', value.serialize())
+    try:
+        return pickle.dumps(value, protocol=4)
+    except Exception as e:
+        # repr() would embed object ids and differ between processes
+        raise TypeError(
+            f"cannot build a stable cache key from a {type(value).__name__}; pass key= to memoize"
+        ) from e
+
+
+def make_key(name, args=(), kwargs=None):
+    parts = (name, [_key_part(a) for a in args], sorted((k, _key_part(v)) for k, v in (kwargs or {}).items()))
+    return hashlib.sha256(pickle.dumps(parts, protocol=4)).hexdigest()
+
+
+class ResultCache(SQLiteStore):
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, default_ttl=None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        super().__init__(path or os.path.join(CACHE_DIR, 'results.sqlite'), _SCHEMA)
+
+    def get(self, key, default=None):
+        con = self._connect()
+        now = time.time()
+        row = con.execute('SELECT rowid, value, expires, accessed FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[2] is not None and row[2] < now):
+            if row is not None:
+                con.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._count(con, 'misses')
+            return default
+        self._touch(con, 'entries', row[0], row[3], now)
+        self._count(con, 'hits')
+        return pickle.loads(row[1])
+
+    def set(self, key, value, ttl=None):
+        """store a value; values larger than the whole budget are not cached"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return False
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        with self._transaction() as con:
+            con.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), now + ttl if ttl else None, now),
+            )
+            con.execute('DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?', (now,))
+            self._evict(con, 'entries', self.max_bytes)
+            self._flush_counts(con)
+        return True
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        con = self._connect()
+        con.execute('DELETE FROM entries')
+        con.execute("UPDATE stats SET value = 0")
+        self._reset_counts()
+
+    def stats(self):
+        con = self._connect()
+        self._flush_counts(con)
+        stats = dict(con.execute('SELECT name, value FROM stats').fetchall())
+        entries, size = con.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats.update(entries=entries, bytes=size, max_bytes=self.max_bytes,
+                     hit_rate=stats['hits'] / lookups if lookups else 0.0)
+        return stats
+
+    def memoize(self, ttl=None, name=None, key=None):
+        """
+        decorator caching a function's result; `key` maps the call arguments to
+        something hashable when they cannot be pickled (e.g. uploaded files)
+        """
+        def decorator(func):
+            prefix = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if key is not None:
+                    cache_key = make_key(prefix, (key(*args, **kwargs),))
+                else:
+                    cache_key = make_key(prefix, args, kwargs)
+                value = self.get(cache_key, _MISSING)
+                if value is _MISSING:
+                    value = func(*args, **kwargs)
+                    self.set(cache_key, value, ttl)
+                return value
+
+            wrapper.cache = self
+            return wrapper
+        return decorator
+
+
+cache = ResultCache()
+
+
+def uploaded_file_key(data):
+    """cache key for a Streamlit UploadedFile: its name and content hash"""
+    return (data.name, hashlib.sha256(data.getbuffer()).hexdigest())
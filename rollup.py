@@ -0,0 +1,42 @@
+"""
+Level x topic rollup cube for the choropleth.
+
+All topic columns are summed for every level once per data version and aligned
+positionally to the rows of that level's boundary frame, so switching the level
+slider or the topic radio is an array lookup instead of a groupby + merge.
+"""
+import numpy as np
+
+import duck_engine
+
+
+class RollupCube:
+
+    def __init__(self, topics, values, version=None):
+        self.topics = list(topics)
+        self.values = values  # level -> float array (n boundary rows, n topics)
+        self.version = version
+        self._topic_index = {t: i for i, t in enumerate(self.topics)}
+
+    def levels(self):
+        return list(self.values)
+
+    def counts(self, level, topic):
+        """sums of one topic column for each row of the level's boundary frame (NaN where no data)"""
+        return self.values[level][:, self._topic_index[topic]]
+
+
+def build_rollup_cube_duckdb(levels, level_keys, topics, version=None):
+    """
+    the cube for `levels`, aggregated in DuckDB over the boundary and `allcounts` tables
+    registered in duck_engine; level_keys: level -> [group column] (as in level_dict),
+    topics: topic columns to sum
+    """
+    topics = list(topics)
+    values = {}
+    for level in levels:
+        table = duck_engine.level_topic_sums(level, level_keys[level][0], topics)
+        aligned = np.column_stack([table.column(t).to_numpy(zero_copy_only=False) for t in topics]).astype(np.float64)
+        aligned.setflags(write=False)
+        values[level] = aligned
+    return RollupCube(topics, values, version)
@@ -0,0 +1,98 @@
+"""
+Process-wide, read-only data layer shared by every Streamlit session.
+
+st.experimental_memo hands each session its own copy of a cached result, so the
+enriched table and the boundary frames were held once per concurrent user.
+Here every table is loaded once per process and data version. Sessions get
+shallow views of it: with pandas copy-on-write enabled (the app turns it on
+with enable_copy_on_write) a session that modifies its view gets a private copy
+of just the touched columns, and the shared frame never changes. Without
+copy-on-write, sessions get the shared frame itself and must not modify it in
+place; copying it on every rerun would cost more than the memo it replaces.
+Arrays are handed out as non-writeable views.
+
+The frames themselves come from memory-mapped snapshot files, so several
+worker processes reading the same version also share the file pages through
+the OS page cache.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def enable_copy_on_write():
+    """turn on pandas copy-on-write; False when this pandas does not have it"""
+    try:
+        pd.set_option('mode.copy_on_write', True)
+    except (KeyError, pd.errors.OptionError):
+        return False
+    return True
+
+
+def copy_on_write():
+    """whether pandas copy-on-write is on"""
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+def readonly_view(value):
+    """a view of a shared value that cannot be used to modify it"""
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, (pd.DataFrame, pd.Series)) and copy_on_write():
+        return value.copy(deep=False)
+    return value
+
+
+def nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    return int(getattr(value, 'nbytes', 0))
+
+
+class SharedTables:
+
+    def __init__(self):
+        self._values = {}  # (version, name) -> value
+        self._locks = {}   # (version, name) -> Lock, so each table is loaded once
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, version, name, load):
+        """read-only view of a table, calling load() the first time it is asked for"""
+        key = (version, name)
+        value = self._values.get(key)
+        if value is None:
+            with self._key_lock(key):
+                value = self._values.get(key)
+                if value is None:
+                    value = load()
+                    with self._lock:
+                        self._values[key] = value
+                        self._drop_older(version)
+        return readonly_view(value)
+
+    def _drop_older(self, version):
+        # a new data version replaces the old one; sessions still holding views keep it alive
+        for key in [k for k in self._values if k[0] != version]:
+            del self._values[key]
+            self._locks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            items = list(self._values.items())
+        return {
+            'tables': len(items),
+            'bytes': sum(nbytes(value) for _, value in items),
+            'copy_on_write': copy_on_write(),
+        }
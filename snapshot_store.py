@@ -0,0 +1,192 @@
+"""
+Versioned local snapshots of the BigQuery tables.
+
+Each table is written once per data version as (Geo)Parquet under
+SNAPSHOT_DIR/<version>/<name>.parquet and recorded in SNAPSHOT_DIR/manifest.json.
+The version is derived from the source tables' metadata (last modified time and
+row count), so snapshots are invalidated by data changes, not by code edits.
+Each table is tracked on its own: it becomes the current copy of that table
+once it is fully written, and its copies in all but the KEEP_VERSIONS most
+recent versions are pruned then. Levels are loaded lazily, so a version never
+has to hold every table.
+"""
+import contextlib
+import fcntl
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = os.environ.get('GEOAPP_SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshots'))
+MANIFEST = 'manifest.json'
+KEEP_VERSIONS = 2
+
+
+def source_version(client, table_ids, optional=()):
+    """
+    fingerprint of the source tables, from BigQuery metadata only (no query is run);
+    tables in `optional` may not exist, which is part of the fingerprint instead of an error
+    """
+    from google.api_core.exceptions import NotFound
+    digest = hashlib.sha256()
+    for table_id in sorted(set(table_ids) | set(optional)):
+        try:
+            table = client.get_table(table_id.replace('`', ''))
+        except NotFound:
+            if table_id not in optional:
+                raise
+            digest.update(f"{table_id}|missing\n".encode())
+            continue
+        digest.update(f"{table_id}|{table.modified.isoformat()}|{table.num_rows}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def table_exists(client, table_id):
+    from google.api_core.exceptions import NotFound
+    try:
+        client.get_table(table_id.replace('`', ''))
+    except NotFound:
+        return False
+    return True
+
+
+def atomic_write(path, write):
+    # write next to the target and rename, so readers in other processes never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class SnapshotStore:
+
+    def __init__(self, root=SNAPSHOT_DIR, keep=KEEP_VERSIONS):
+        self.root = root
+        self.keep = keep
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        # serialize manifest updates between worker processes
+        with open(os.path.join(self.root, '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return {'current': None, 'versions': {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        def write(tmp):
+            with open(tmp, 'w') as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+        atomic_write(os.path.join(self.root, MANIFEST), write)
+
+    def path(self, version, name):
+        return os.path.join(self.root, version, f"{name}.parquet")
+
+    def has(self, version, name):
+        entry = self.manifest()['versions'].get(version, {})
+        return name in entry.get('tables', {}) and os.path.exists(self.path(version, name))
+
+    def current_version(self, name=None):
+        """the newest version with any table written, or the newest one holding table `name`"""
+        manifest = self.manifest()
+        if name is None:
+            return manifest['current']
+        return manifest.get('latest', {}).get(name)
+
+    def _record(self, version, name, rows, geo, columns):
+        # a table becomes current once it is fully written, each on its own, and its
+        # copies in older versions are pruned then; tables never loaded are never required
+        with self._lock():
+            manifest = self.manifest()
+            entry = manifest['versions'].setdefault(version, {'created': time.time(), 'tables': {}})
+            entry['tables'][name] = {'rows': rows, 'geo': geo, 'columns': [str(c) for c in columns]}
+            manifest.setdefault('latest', {})[name] = version
+            manifest['current'] = version
+            self._prune(manifest, [name], self.keep)
+            self._save_manifest(manifest)
+
+    def write(self, version, name, frame):
+        """write one table of a version; GeoDataFrames are stored as GeoParquet"""
+        os.makedirs(os.path.join(self.root, version), exist_ok=True)
+        atomic_write(self.path(version, name), lambda tmp: frame.to_parquet(tmp, index=False))
+        self._record(version, name, len(frame), isinstance(frame, gpd.GeoDataFrame), frame.columns)
+
+    def write_batches(self, version, name, batches, schema=None, geo=False):
+        """
+        stream arrow record batches into one table, one row group at a time, so memory
+        stays bounded by the batch size; a GeoParquet table needs 'geo' schema metadata
+        """
+        os.makedirs(os.path.join(self.root, version), exist_ok=True)
+        batches = iter(batches)
+        first = next(batches, None)
+        if first is None and schema is None:
+            raise ValueError(f"No batches and no schema for {name}")
+        schema = schema or first.schema
+        batches = itertools.chain([first] if first is not None else [], batches)
+        rows = 0
+
+        def write(tmp):
+            nonlocal rows
+            with pq.ParquetWriter(tmp, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+
+        atomic_write(self.path(version, name), write)
+        self._record(version, name, rows, geo, schema.names)
+
+    def read(self, name, version=None, columns=None, memory_map=True):
+        """read one table, optionally projected to `columns`; memory-mapped by default"""
+        version = version or self.current_version(name)
+        info = self.manifest()['versions'][version]['tables'][name]
+        path = self.path(version, name)
+        if info['geo']:
+            return gpd.read_parquet(path, columns=columns, memory_map=memory_map)
+        return pq.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+
+    def read_arrow(self, name, version=None, columns=None):
+        """memory-mapped arrow table of one snapshot, for zero-copy registration in DuckDB"""
+        version = version or self.current_version(name)
+        return pq.read_table(self.path(version, name), columns=columns, memory_map=True)
+
+    def prune(self, keep=None):
+        """keep only the `keep` most recent copies of every table"""
+        with self._lock():
+            manifest = self.manifest()
+            names = {name for entry in manifest['versions'].values() for name in entry['tables']}
+            self._prune(manifest, names, self.keep if keep is None else keep)
+            self._save_manifest(manifest)
+
+    def _prune(self, manifest, names, keep):
+        versions = manifest['versions']
+        ordered = sorted(versions, key=lambda v: versions[v]['created'], reverse=True)
+        for name in names:
+            holding = [v for v in ordered if name in versions[v]['tables']]
+            for version in holding[keep:]:
+                del versions[version]['tables'][name]
+                if os.path.exists(self.path(version, name)):
+                    os.remove(self.path(version, name))
+        for version in [v for v in ordered if not versions[v]['tables']]:
+            del versions[version]
+            try:
+                os.rmdir(os.path.join(self.root, version))
+            except OSError:
+                pass
@@ -0,0 +1,68 @@
+"""
+STRtree index over one boundary level.
+
+Built once per data version and shared by every session of the process. It
+answers viewport (bbox) queries, so only polygons in a padded window around
+the map centre are sent to the map, and point lookups for map clicks, both without scanning the frame.
+"""
+import math
+
+import numpy as np
+import shapely
+
+TILE_SIZE = 256
+# the Kepler map gets a data window, not the exact viewport: it is sized for a wide
+# screen and padded by WINDOW_PAD screens on each side, so panning by a screen or
+# zooming out a level in the browser does not reach its edge
+WINDOW_WIDTH = 2560
+WINDOW_HEIGHT = 1440
+WINDOW_PAD = 1.0
+
+
+class LevelIndex:
+
+    def __init__(self, geometry):
+        self.geometry = np.asarray(geometry)
+        self.tree = shapely.STRtree(self.geometry)
+
+    def __len__(self):
+        return len(self.geometry)
+
+    def query_bbox(self, minx, miny, maxx, maxy):
+        """sorted row positions of the polygons intersecting the bbox"""
+        hits = self.tree.query(shapely.box(minx, miny, maxx, maxy), predicate='intersects')
+        return np.sort(hits)
+
+    def lookup_point(self, lon, lat):
+        """row position of the polygon containing the point, or None"""
+        hits = self.tree.query(shapely.points(lon, lat), predicate='intersects')
+        if len(hits) == 0:
+            return None
+        return int(hits.min())
+
+
+def viewport_bounds(lon, lat, zoom, width=1200, height=500, pad=0.0):
+    """
+    lon/lat bbox shown by a web-mercator map of width x height pixels centred on lon/lat,
+    grown by `pad` times the width / height on each side
+    """
+    width, height = width * (1 + 2 * pad), height * (1 + 2 * pad)
+    world = TILE_SIZE * 2 ** zoom
+    # center in global pixel coordinates
+    x = (lon + 180.0) / 360.0 * world
+    siny = min(max(math.sin(math.radians(lat)), -0.9999), 0.9999)
+    y = (0.5 - math.log((1 + siny) / (1 - siny)) / (4 * math.pi)) * world
+
+    def to_lonlat(px, py):
+        lon_ = px / world * 360.0 - 180.0
+        n = math.pi - 2 * math.pi * py / world
+        return lon_, math.degrees(math.atan(math.sinh(n)))
+
+    minx, maxy = to_lonlat(x - width / 2, max(y - height / 2, 0))
+    maxx, miny = to_lonlat(x + width / 2, min(y + height / 2, world))
+    return max(minx, -180.0), miny, min(maxx, 180.0), maxy
+
+
+def data_window(lon, lat, zoom):
+    """padded bbox of the polygons sent to a map the user can pan and zoom in the browser"""
+    return viewport_bounds(lon, lat, zoom, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_PAD)
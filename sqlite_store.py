@@ -0,0 +1,92 @@
+"""
+Base for the SQLite files kept next to the result cache (result_cache,
+area_stats, tile_proxy).
+
+Each store is one file in WAL mode with one connection per thread; SQLite
+handles locking between processes. Stores that count hits and misses keep the
+counts in memory and flush them to their stats table every FLUSH_EVERY lookups
+(and when asked), and a cached row's last-access time is only rewritten when it
+is older than TOUCH_SECONDS, so a cache hit stays off the write lock.
+"""
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+TOUCH_SECONDS = 60  # LRU resolution: recency finer than this does not matter for eviction
+FLUSH_EVERY = 100
+
+
+class SQLiteStore:
+
+    counters = ('hits', 'misses')
+
+    def __init__(self, path, schema):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._counts = dict.fromkeys(self.counters, 0)  # not yet flushed to the stats table
+        self._counts_lock = threading.Lock()
+        self._connect().executescript(schema)
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+        return con
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        con = self._connect()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            yield con
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+    def _bump(self, con, name, n=1):
+        con.execute('UPDATE stats SET value = value + ? WHERE name = ?', (n, name))
+
+    def _count(self, con, name):
+        with self._counts_lock:
+            self._counts[name] += 1
+            due = sum(self._counts.values()) >= FLUSH_EVERY
+        if due:
+            self._flush_counts(con)
+
+    def _flush_counts(self, con):
+        with self._counts_lock:
+            counts, self._counts = self._counts, dict.fromkeys(self.counters, 0)
+        for name, n in counts.items():
+            if n:
+                self._bump(con, name, n)
+
+    def _reset_counts(self):
+        with self._counts_lock:
+            self._counts = dict.fromkeys(self.counters, 0)
+
+    def _touch(self, con, table, rowid, accessed, now=None):
+        now = time.time() if now is None else now
+        if now - accessed > TOUCH_SECONDS:
+            con.execute(f"UPDATE {table} SET accessed = ? WHERE rowid = ?", (now, rowid))
+
+    def _evict(self, con, table, max_bytes):
+        """delete the least recently used rows of `table` until its total size fits max_bytes"""
+        victims = con.execute(
+            f"""
+            SELECT rowid FROM (
+                SELECT rowid, SUM(size) OVER (ORDER BY accessed DESC, rowid) AS running FROM {table}
+            ) WHERE running > ?
+            """,
+            (max_bytes,),
+        ).fetchall()
+        if victims:
+            con.executemany(f"DELETE FROM {table} WHERE rowid = ?", victims)
+            self._bump(con, 'evictions', len(victims))
+        return len(victims)
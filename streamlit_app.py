@@ -1,25 +1,45 @@
 import streamlit as st
 import leafmap.kepler as leafmap
+import leafmap.foliumap as foliumap
+import folium
+from folium.plugins import VectorGridProtobuf
+from streamlit_folium import st_folium
 # import leafmap.foliumap as leafmap
 # import leafmap
-import pandas_gbq
-from google.oauth2 import service_account
-from google.cloud import bigquery
 import geopandas as gpd
 import pandas as pd
-from shapely import wkt
-import sqlalchemy
-
-eng = sqlalchemy.create_engine("duckdb:///:memory:")
+import numpy as np
+
+import apportion
+import boundary_loader
+import classify
+import clients
+import compact
+import duck_engine
+import geo_ingest
+import lod
+import pushdown
+from result_cache import cache
+import rollup
+import shared_data
+import snapshot_store
+import spatial_index
+import topo_encode
+import vector_tiles
 
 # Create API client.
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"]
-)
-client = bigquery.Client(credentials=credentials)
+@st.experimental_singleton
+def get_clients():
+    # credentials, HTTP session and clients are built once per process, not on every rerun
+    return clients.ClientManager(dict(st.secrets["gcp_service_account"]))
 
 st.set_page_config(layout="wide")
 
+# sessions share the loaded tables as shallow views (see shared_data)
+shared_data.enable_copy_on_write()
+
+client = get_clients().bigquery
+
 # Customize the sidebar
 markdown = """
 Web App URL: <https://template.streamlitapp.com>
@@ -31,6 +51,13 @@ st.sidebar.info(markdown)
 logo = "https://i.imgur.com/UbOXYAU.png"
 st.sidebar.image(logo)
 
+with st.sidebar.expander("Cache statistics"):
+    st.json(cache.stats())
+
+with st.sidebar.expander("Connections"):
+    if st.button("Check connections"):
+        st.json(get_clients().health())
+
 ###############################################
 ## LEVEL + TOPIC MAPPING
 ###############################################
@@ -40,8 +67,8 @@ level_dict = {
     'States':['state_code'],
     'Districts':['district_code'],
     'Subdistricts':['taluk_code'],
-    'Parlamentary Constituencies':[''],
-    'Assembly Consituencies':['']
+    'Parlamentary Constituencies':['pc_code'],
+    'Assembly Consituencies':['ac_code']
 }
 
 topic_dict = {
@@ -66,65 +93,281 @@ st.markdown(
 
 st.header("Instructions")
 
-@st.experimental_memo(persist="disk")
-def fetch_enriched_data():
-    # Fetch data from URL here, and then clean it up.
-    query = """
-            SELECT * FROM `dev-ind-geo-01.enriched.data_subdistricts`
-            """
-    data = pandas_gbq.read_gbq(query, credentials=credentials)
-    return data
-
-@st.experimental_memo(persist="disk")
-def fetch_boundary_data():
-    country = pandas_gbq.read_gbq("SELECT country_code,country_name,geom_text FROM dev-ind-geo-01.geoprocessed.country", credentials=credentials)
-    country = gpd.GeoDataFrame(country,crs="EPSG:4326",geometry=country['geom_text'].apply(wkt.loads))
-
-    states = pandas_gbq.read_gbq("SELECT state_code,state_name,geom_text FROM dev-ind-geo-01.geoprocessed.states", credentials=credentials)
-    states = gpd.GeoDataFrame(states,crs="EPSG:4326",geometry=states['geom_text'].apply(wkt.loads))
-
-    districts = pandas_gbq.read_gbq("SELECT district_code,district_name,geom_text FROM dev-ind-geo-01.geoprocessed.districts", credentials=credentials)
-    districts = gpd.GeoDataFrame(districts,crs="EPSG:4326",geometry=districts['geom_text'].apply(wkt.loads))
-
-    subdistricts = pandas_gbq.read_gbq("SELECT taluk_code,taluk_name,geom_text FROM dev-ind-geo-01.geoprocessed.subdistricts", credentials=credentials)
-    subdistricts = gpd.GeoDataFrame(subdistricts,crs="EPSG:4326",geometry=subdistricts['geom_text'].apply(wkt.loads))
-
-    return country,states,districts,subdistricts
+ENRICHED_TABLE = 'dev-ind-geo-01.enriched.data_subdistricts'
+BOUNDARY_LEVELS = ['Country', 'States', 'Districts', 'Subdistricts']
+# not part of the admin hierarchy: counts are apportioned from subdistricts by area
+CONSTITUENCY_LEVELS = ['Parlamentary Constituencies', 'Assembly Consituencies']
+
+store = snapshot_store.SnapshotStore()
+
+@cache.memoize(ttl=600)
+def fetch_data_version():
+    # metadata only: changes when any source table changes; constituency tables may be absent
+    tables = [ENRICHED_TABLE] + [geo_ingest.BOUNDARY_TABLES[lvl][0] for lvl in BOUNDARY_LEVELS]
+    optional = [geo_ingest.BOUNDARY_TABLES[lvl][0] for lvl in CONSTITUENCY_LEVELS]
+    try:
+        return snapshot_store.source_version(client, tables, optional)
+    except Exception:
+        # offline: fall back to the newest local snapshot
+        if store.current_version() is None:
+            raise
+        return store.current_version()
+
+@cache.memoize(ttl=600)
+def fetch_available_levels(version):
+    # constituency levels are only offered when their boundary table exists (or is already stored)
+    def available(lvl):
+        if lvl not in CONSTITUENCY_LEVELS or store.has(version, lvl):
+            return True
+        try:
+            return snapshot_store.table_exists(client, geo_ingest.BOUNDARY_TABLES[lvl][0])
+        except Exception:
+            return False
+    return [lvl for lvl in level_dict if available(lvl)]
+
+def progress_bar(label):
+    """progress(done, total) callback drawing a Streamlit progress bar, for streamed downloads"""
+    caption, bar = st.empty(), st.empty()
+    def update(done, total):
+        if total:
+            caption.caption(f"{label}: {done:,} / {total:,} rows")
+            bar.progress(min(done / total, 1.0))
+        if done >= total:
+            caption.empty()
+            bar.empty()
+    return update
+
+def ensure_enriched(version, progress=None):
+    # streamed in batches straight into the snapshot, compacted on the way
+    if store.has(version, 'data_subdistricts'):
+        return
+    integers = [
+        field.name for field in client.get_table(ENRICHED_TABLE).schema
+        if field.field_type in ('INTEGER', 'INT64') and field.name not in compact.HIERARCHY
+    ]
+    types = {}
+    if integers:
+        ranges = client.query(compact.integer_ranges_sql(ENRICHED_TABLE, integers)).result()
+        ranges = ranges.to_arrow(create_bqstorage_client=False).to_pylist()[0]
+        types = compact.count_types(ranges, integers)
+    geo_ingest.stream_table(
+        client, f"SELECT * FROM `{ENRICHED_TABLE}`", store, version, 'data_subdistricts',
+        transform=lambda batch: compact.compact_batch(batch, types), progress=progress,
+        bqstorage_client=get_clients().bqstorage,
+    )
+
+@st.experimental_singleton
+def get_shared_tables():
+    # one read-only copy of each table per process; sessions get views, not copies
+    return shared_data.SharedTables()
+
+def load_enriched_data(version):
+    # categorical admin codes + downcast counts, kept that way in the snapshot
+    ensure_enriched(version)
+    return compact.order_hierarchy(store.read('data_subdistricts', version))
+
+def fetch_enriched_data(version):
+    return get_shared_tables().get(version, 'data_subdistricts', lambda: load_enriched_data(version))
+
+@st.experimental_memo
+def fetch_memory_report(version):
+    data = fetch_enriched_data(version)
+    return compact.memory_report(compact.widen(data), data)
+
+@st.experimental_singleton
+def get_boundary_loader():
+    # geometries come back as WKB in arrow batches and are decoded in bulk
+    # and streamed batch by batch into the snapshot store as GeoParquet
+    return boundary_loader.BoundaryLoader(
+        store, lambda version, lvl, progress=None: geo_ingest.stream_boundary_level(
+            client, lvl, store, version, progress, bqstorage_client=get_clients().bqstorage)
+    )
+
+def fetch_boundary_level(version, level):
+    # each level is fetched on first access and shared on its own
+    return get_shared_tables().get(version, level, lambda: get_boundary_loader().load(version, level))
+
+def load_lod_geometry(version, level, lod_index):
+    # simplified geometries for one level, built once per data version for every LOD
+    name = f"{level}_lod{lod_index}"
+    if not store.has(version, name):
+        full = fetch_boundary_level(version, level)
+        for i, geometry in enumerate(lod.build_pyramid(full.geometry.values)):
+            store.write(version, f"{level}_lod{i}", gpd.GeoDataFrame(geometry=geometry, crs=full.crs))
+    return np.asarray(store.read(name, version).geometry.values)
+
+def fetch_lod_geometry(version, level, lod_index):
+    return get_shared_tables().get(version, f"{level}_lod{lod_index}", lambda: load_lod_geometry(version, level, lod_index))
+
+@st.experimental_singleton
+def start_tile_server():
+    # one tile server thread per process, shared by every session
+    layers = vector_tiles.TileLayers()
+    vector_tiles.serve(layers)
+    return layers
+
+def tile_layer_version(version, scheme, mode):
+    # features carry one class index per topic, so the layer is per data version, classification scheme
+    # and the aggregation mode the counts came from
+    return f"{version}:{scheme}:{mode}"
+
+def publish_tile_layer(layers, version, level, scheme, mode):
+    layer_version = tile_layer_version(version, scheme, mode)
+    if layers.has_layer(level, layer_version):
+        return
+    pyramid = [fetch_lod_geometry(version, level, i) for i in range(len(lod.TOLERANCES))]
+    properties = pd.DataFrame(level_df_dict[level].drop(columns='geometry'))
+    breaks = fetch_class_breaks(version, level, scheme, mode)
+    for t in topic_dict.values():
+        properties[t] = classify.classify(level_counts(version, level, t, mode), breaks[t])
+    layers.set_layer(level, layer_version, pyramid, properties)
+
+@st.experimental_memo
+def fetch_topology(version, level, lod_index):
+    # quantized, arc-shared geometry for one LOD; topic counts are attached per rerun
+    return topo_encode.topology(fetch_lod_geometry(version, level, lod_index))
+
+@st.experimental_memo
+def fetch_class_breaks(version, level, scheme, mode):
+    # breaks for every topic of a level at once, once per data version and aggregation mode
+    return {t: classify.SCHEMES[scheme](level_counts(version, level, t, mode)) for t in topic_dict.values()}
+
+@st.experimental_memo
+def fetch_payload_sizes(version, level, lod_index):
+    frame = fetch_boundary_level(version, level)
+    frame = frame[level_dict[level]].assign(geometry=fetch_lod_geometry(version, level, lod_index))
+    return topo_encode.payload_sizes(gpd.GeoDataFrame(frame, geometry='geometry', crs='EPSG:4326'))
+
+def class_colors(classes, palette=vector_tiles.DEFAULT_PALETTE):
+    """palette colour per class index, grey for units without data (-1)"""
+    return np.where(classes >= 0, np.take(palette, np.clip(classes, 0, len(palette) - 1)), '#cccccc')
+
+def kepler_config(layer, palette=vector_tiles.DEFAULT_PALETTE):
+    # colour the layer by the precomputed class index instead of Kepler's own scaling of the counts
+    return {'version': 'v1', 'config': {'visState': {'layers': [{
+        'type': 'geojson',
+        'config': {
+            'dataId': layer, 'label': layer, 'isVisible': True,
+            'columns': {'geojson': 'geometry'},
+            'colorField': {'name': 'cls', 'type': 'integer'}, 'colorScale': 'ordinal',
+            'visConfig': {'opacity': 0.7, 'filled': True, 'stroked': True, 'thickness': 0.5,
+                          'colorRange': {'name': 'classes', 'type': 'sequential', 'colors': list(palette)}},
+        },
+        'visualChannels': {'colorField': {'name': 'cls', 'type': 'integer'}, 'colorScale': 'ordinal'},
+    }]}}}
+
+@st.experimental_singleton
+def get_level_index(version, level):
+    # STRtree over the full-resolution polygons, built once per data version per process
+    return spatial_index.LevelIndex(fetch_boundary_level(version, level).geometry.values)
+
+def register_duckdb_tables(version, levels):
+    # arrow tables straight from the memory-mapped snapshots, registered once per version per process
+    fetch_enriched_data(version)
+    duck_engine.register_arrow('allcounts', store.read_arrow('data_subdistricts', version), version)
+    for lvl in levels:
+        get_boundary_loader().ensure(version, lvl)
+        columns = geo_ingest.BOUNDARY_TABLES[lvl][1]
+        duck_engine.register_arrow(lvl, duck_engine.with_row_numbers(store.read_arrow(lvl, version, columns)), version)
+
+@st.experimental_memo
+def fetch_rollup_cube(version, level):
+    # every topic summed for one level in DuckDB, once per data version
+    register_duckdb_tables(version, [level])
+    return rollup.build_rollup_cube_duckdb([level], level_dict, topic_dict.values(), version)
+
+@st.experimental_singleton
+def get_query_cache():
+    return pushdown.QueryCache()
+
+@st.experimental_memo
+def fetch_pushdown_counts(version, level, runner_name):
+    # grouped SQL for every topic of one level, run where the data is and cached on disk by query hash
+    key = level_dict[level][0]
+    if runner_name == 'duckdb':
+        # local stand-in: the snapshot registered under the BigQuery table id
+        duck_engine.register_arrow(ENRICHED_TABLE, store.read_arrow('data_subdistricts', version), version)
+        runner = pushdown.duckdb_runner(duck_engine.query_arrow)
+    else:
+        runner = pushdown.bigquery_runner(client)
+    sql = pushdown.grouped_sql(ENRICHED_TABLE, key, topic_dict.values())
+    sums = get_query_cache().get_or_run(sql, runner, version).to_pandas().set_index(key).astype(np.float64)
+    return sums.reindex(fetch_boundary_level(version, level)[key].to_numpy())
+
+@st.experimental_memo
+def fetch_apportion_weights(version, level):
+    # sparse constituency x subdistrict area weights, overlaid once per data version
+    name = f"weights_{level}"
+    source = fetch_boundary_level(version, 'Subdistricts')
+    target = fetch_boundary_level(version, level)
+    if not store.has(version, name):
+        store.write(version, name, apportion.weights_to_frame(apportion.overlay_weights(source, target)))
+    return apportion.weights_from_frame(store.read(name, version), (len(target), len(source)))
+
+def level_counts(version, level, topic_column, mode):
+    # topic sums aligned to the rows of the level's boundary frame, in the given aggregation mode
+    if level in CONSTITUENCY_LEVELS:
+        return apportion.apportion(fetch_apportion_weights(version, level), level_counts(version, 'Subdistricts', topic_column, mode))
+    if mode == 'Pushdown (BigQuery)':
+        return fetch_pushdown_counts(version, level, 'bigquery')[topic_column].to_numpy()
+    if mode == 'Pushdown (DuckDB stand-in)':
+        return fetch_pushdown_counts(version, level, 'duckdb')[topic_column].to_numpy()
+    return fetch_rollup_cube(version, level).counts(level, topic_column)
 
 # AGGREGATE DATA
-df=fetch_enriched_data()
-# DUCK DB TABLE
-eng.execute("register", ("allcounts", df))
-st.dataframe(df)
+data_version = fetch_data_version()
+with st.sidebar.expander("Shared tables"):
+    st.json(get_shared_tables().stats())
+aggregation_mode = st.sidebar.radio(
+    'Aggregation mode',
+    options=['Full table (local)', 'Pushdown (BigQuery)', 'Pushdown (DuckDB stand-in)'],
+)
+if aggregation_mode != 'Pushdown (BigQuery)':
+    ensure_enriched(data_version, progress_bar('Downloading the enriched table'))
+    df=fetch_enriched_data(data_version)
+    st.dataframe(df)
+    with st.expander("Memory usage of the enriched table"):
+        st.dataframe(fetch_memory_report(data_version))
 # outdf = gpd.GeoDataFrame()
 # st.write(pd.__version__)
 
 # BOUNDARY DATA
+# levels are loaded lazily below, only the selected one is fetched
 level_df_dict={}
-level_df_dict['Country'],level_df_dict['States'],level_df_dict['Districts'],level_df_dict['Subdistricts'] = fetch_boundary_data()
-level_df_dict['Parlamentary Constituencies'] = None
-level_df_dict['Assembly Consituencies'] = None
 # country_df,states_df,districts_df,subdistricts_df = fetch_boundary_data()
 
-# DUCK DB TABLES
-eng.execute("register", ("Country", pd.DataFrame(level_df_dict['Country'].drop('geometry',axis=1))))
-eng.execute("register", ("States", pd.DataFrame(level_df_dict['States'].drop('geometry',axis=1))))
-eng.execute("register", ("Districts", pd.DataFrame(level_df_dict['Districts'].drop('geometry',axis=1))))
-eng.execute("register", ("Subdistricts", pd.DataFrame(level_df_dict['Subdistricts'].drop('geometry',axis=1))))
-
 st.markdown(markdown)
 
+available_levels = fetch_available_levels(data_version)
 level = st.select_slider(
      'Select a level of the data',
-     options=list(level_dict.keys())) # ['Country', 'States', 'Districts', 'Subdistricts', 'Parlamentary Constituencies', 'Assembly Consituencies']
+     options=available_levels) # ['Country', 'States', 'Districts', 'Subdistricts', 'Parlamentary Constituencies', 'Assembly Consituencies']
 st.write('My favorite Level is', level)
 
 topic = st.radio('Topic', options=list(topic_dict.keys()),horizontal=True) # ['Roads','Habitations','Facilities','Proposals','Buildings','OpenStreetMap PoIs']
 st.write('Count how many of ',topic,' are available.')
 
+# for Kepler these also set the data window: the polygons around this centre (padded a screen each way) are sent
+window_help = "Kepler (GeoJSON) only gets the units within a padded window around this centre and zoom; move it here to load others"
+latitude = st.number_input("Map / data window center latitude", -90.0, 90.0, 22.0, step=0.5, help=window_help)
+longitude = st.number_input("Map / data window center longitude", -180.0, 180.0, 80.0, step=0.5, help=window_help)
+zoom = st.slider('Map / data window zoom level', 1, 12, 4, help=window_help)
+# vector tiles need a tile server URL the browser can reach (GEOAPP_TILE_URL)
+renderers = ['Kepler (GeoJSON)', 'TopoJSON'] + (['Vector tiles'] if vector_tiles.ENABLED else [])
+renderer = st.radio('Map renderer', options=renderers, horizontal=True)
+scheme = st.radio('Classification', options=list(classify.SCHEMES), horizontal=True)
+
 
 group_attr = level_dict[level]
+get_boundary_loader().ensure(data_version, level, progress_bar(f'Downloading {level} boundaries'))
+level_df_dict[level] = fetch_boundary_level(data_version, level)
 outdf = level_df_dict[level]
+level_index = get_level_index(data_version, level)
+
+# warm the neighbouring levels of the slider in the background
+levels = available_levels
+neighbours = levels[max(levels.index(level) - 1, 0):levels.index(level) + 2]
+get_boundary_loader().prefetch(data_version, neighbours)
 
 # set level in query
 # if level == 'Country':
@@ -156,8 +399,11 @@ outdf = level_df_dict[level]
 #     outdf = subdistricts_df
 #     pass
 
-# group by group attr and sum by topic
-outdf1 = df.groupby(group_attr).agg(cnt = (topic_dict[topic],'sum')).reset_index()
+# look up the topic sums for this level, already aligned to the rows of outdf
+cnt = level_counts(data_version, level, topic_dict[topic], aggregation_mode)
+breaks = fetch_class_breaks(data_version, level, scheme, aggregation_mode)[topic_dict[topic]]
+cls = classify.classify(cnt, breaks)
+labels = np.array(classify.class_labels(breaks) + ['no data'])
 
 # set topic in query
 # if topic == 'Roads':
@@ -185,22 +431,73 @@ outdf1 = df.groupby(group_attr).agg(cnt = (topic_dict[topic],'sum')).reset_index
 #     outdf1 = df.groupby(group_attr).agg(cnt = ('osmpoicnt','sum')).reset_index()
 #     pass
 
-outdf1.columns = group_attr + ['cnt']
-outdf = outdf.merge(outdf1,on=group_attr,how='left')
+# coarsest geometry that still looks exact at this zoom, same row order as outdf
+outdf = outdf.assign(geometry=fetch_lod_geometry(data_version, level, lod.pick_lod(zoom)), cnt=cnt)
+# the map only gets the class of each unit and its range, not the raw counts
+mapdf = outdf.drop(columns='cnt').assign(cls=cls, range=labels[cls])
 
 # TRY DUCK DB
-sql = """
-select c.country_code,a.roadcnt from Country c join allcounts a on c.country_code = a.country_code
-"""
-outduck = pd.read_sql(sql,eng)
-st.dataframe(outduck)
+if aggregation_mode != 'Pushdown (BigQuery)':
+    register_duckdb_tables(data_version, ['Country'])
+    sql = """
+    select c.country_code,a.roadcnt from Country c join allcounts a on c.country_code = a.country_code
+    """
+    outduck = duck_engine.query_arrow(sql)
+    st.dataframe(outduck)
 
 # final geo dataframe for map
 # st.dataframe(outdf)
 st.write(type(outdf))
 
 # activate map with button ?
-m = leafmap.Map(minimap_control=True)
-# m.add_basemap("OpenTopoMap")
-m.add_gdf(outdf, layer_name=level+'__'+topic)
-m.to_streamlit(height=500)
+if renderer == 'Vector tiles':
+    # the browser fetches only the tiles in view; topic classes travel as feature properties
+    tile_layers = start_tile_server()
+    publish_tile_layer(tile_layers, data_version, level, scheme, aggregation_mode)
+    m = foliumap.Map(center=[latitude, longitude], zoom=zoom)
+    VectorGridProtobuf(
+        vector_tiles.tile_url(level, tile_layer_version(data_version, scheme, aggregation_mode)),
+        level+'__'+topic,
+        vector_tiles.choropleth_options(level, topic_dict[topic], len(vector_tiles.DEFAULT_PALETTE)),
+    ).add_to(m)
+    map_state = st_folium(m, height=500, width=None)
+
+    # what unit was clicked: an index lookup, not a scan
+    clicked = (map_state or {}).get('last_clicked')
+    if clicked:
+        row = level_index.lookup_point(clicked['lng'], clicked['lat'])
+        if row is not None:
+            st.dataframe(pd.DataFrame(outdf.drop(columns='geometry').iloc[[row]]))
+elif renderer == 'TopoJSON':
+    # shared borders are sent once, as delta-encoded integer arcs
+    topo = topo_encode.with_properties(
+        fetch_topology(data_version, level, lod.pick_lod(zoom)),
+        pd.DataFrame({c: outdf[c].astype(str) for c in level_dict[level]}).assign(
+            range=mapdf['range'].to_numpy(), fill=class_colors(cls)),
+    )
+    m = foliumap.Map(center=[latitude, longitude], zoom=zoom)
+    folium.TopoJson(
+        topo, 'objects.' + topo_encode.OBJECT_NAME, name=level+'__'+topic,
+        style_function=lambda feature: {'fillColor': feature['properties']['fill'], 'color': '#555555',
+                                        'weight': 0.5, 'fillOpacity': 0.7},
+    ).add_to(m)
+    st_folium(m, height=500, width=None)
+else:
+    # only the polygons inside the data window are sent to the map
+    visible = level_index.query_bbox(*spatial_index.data_window(longitude, latitude, zoom))
+    m = leafmap.Map(center=[latitude, longitude], zoom=zoom, minimap_control=True, config=kepler_config(level+'__'+topic))
+    # m.add_basemap("OpenTopoMap")
+    m.add_gdf(mapdf.iloc[visible], layer_name=level+'__'+topic)
+    m.to_streamlit(height=500)
+
+st.dataframe(pd.DataFrame({
+    'class': labels[:-1],
+    'colour': vector_tiles.DEFAULT_PALETTE[:len(labels) - 1],
+    'units': np.bincount(cls[cls >= 0], minlength=len(labels) - 1),
+}))
+
+with st.expander("Map payload"):
+    # the selected level at the LOD of the current zoom, only on request (every level: benchmarks/bench_topojson.py)
+    if st.button(f"Measure {level} payload"):
+        sizes = fetch_payload_sizes(data_version, level, lod.pick_lod(zoom))
+        st.dataframe(pd.DataFrame.from_dict({level: sizes}, orient='index'))
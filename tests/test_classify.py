@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import classify  # noqa: E402
+
+
+@pytest.mark.parametrize('scheme', list(classify.SCHEMES))
+@pytest.mark.parametrize('values', [[7.0], [3.0, 3.0, 3.0, 3.0], [0.0] * 50], ids=['single', 'equal', 'zeros'])
+def test_constant_values_give_one_class(scheme, values):
+    breaks = classify.SCHEMES[scheme](values)
+    assert len(breaks) == 2
+    assert breaks[0] == breaks[1] == values[0]
+    classes = classify.classify(values, breaks)
+    assert (classes == 0).all()
+    assert len(classify.class_labels(breaks)) == 1
+
+
+@pytest.mark.parametrize('scheme', list(classify.SCHEMES))
+def test_constant_values_legend_columns_align(scheme):
+    # the legend table on the main page: one row per class
+    values = np.array([5.0, 5.0, np.nan])
+    breaks = classify.SCHEMES[scheme](values)
+    classes = classify.classify(values, breaks)
+    labels = classify.class_labels(breaks)
+    units = np.bincount(classes[classes >= 0], minlength=len(labels))
+    assert len(units) == len(labels) == 1
+    assert classes.tolist() == [0, 0, -1]
+
+
+@pytest.mark.parametrize('scheme', list(classify.SCHEMES))
+def test_no_finite_values(scheme):
+    breaks = classify.SCHEMES[scheme]([np.nan, np.nan])
+    assert len(breaks) == 2
+    assert (classify.classify([np.nan], breaks) == -1).all()
+
+
+@pytest.mark.parametrize('scheme', list(classify.SCHEMES))
+def test_skewed_values_fill_k_classes(scheme):
+    values = np.random.default_rng(0).lognormal(3, 1.5, 2000)
+    breaks = classify.SCHEMES[scheme](values)
+    assert len(breaks) == classify.K + 1
+    classes = classify.classify(values, breaks)
+    assert classes.min() == 0 and classes.max() == classify.K - 1
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import pytest
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import compact  # noqa: E402
+import geo_ingest  # noqa: E402
+import snapshot_store  # noqa: E402
+from bench_streaming import COUNT_COLUMNS, FakeClient, fake_batches  # noqa: E402
+
+TYPES = compact.count_types({f"{c}__{b}": v for c in COUNT_COLUMNS for b, v in (('min', 0), ('max', 4999))},
+                            COUNT_COLUMNS)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return snapshot_store.SnapshotStore(str(tmp_path))
+
+
+def stream(store, client, progress=None):
+    geo_ingest.stream_table(
+        client, 'SELECT * FROM enriched', store, 'v1', 'data_subdistricts',
+        transform=lambda batch: compact.compact_batch(batch, TYPES), progress=progress,
+    )
+
+
+def test_stream_table_writes_every_row(store):
+    client = FakeClient(1234, 500)
+    calls = []
+    stream(store, client, lambda done, total: calls.append((done, total)))
+
+    assert client.queries == ['SELECT * FROM enriched']
+    assert calls == [(500, 1234), (1000, 1234), (1234, 1234)]
+    info = store.manifest()['versions']['v1']['tables']['data_subdistricts']
+    assert info['rows'] == 1234 and not info['geo']
+    assert store.current_version('data_subdistricts') == 'v1'
+
+    expected = pa.Table.from_batches(list(fake_batches(1234, 500))).to_pandas()
+    table = store.read('data_subdistricts', 'v1')
+    assert len(table) == 1234
+    for column in COUNT_COLUMNS:
+        np.testing.assert_array_equal(table[column].to_numpy(), expected[column].to_numpy())
+    assert (table['taluk_code'].astype(str).to_numpy() == expected['taluk_code'].to_numpy()).all()
+
+
+def test_stream_table_keeps_the_compacted_schema(store):
+    stream(store, FakeClient(1000, 300))
+    schema = store.read_arrow('data_subdistricts', 'v1').schema
+    for column in compact.HIERARCHY:
+        assert pa.types.is_dictionary(schema.field(column).type)
+    for column in COUNT_COLUMNS:
+        assert schema.field(column).type == pa.uint16()
+    assert store.read('data_subdistricts', 'v1')['roads'].dtype == np.uint16
+
+
+def test_empty_result_writes_an_empty_table(store):
+    calls = []
+    stream(store, FakeClient(0, 500), lambda done, total: calls.append((done, total)))
+    table = store.read_arrow('data_subdistricts', 'v1')
+    assert table.num_rows == 0
+    assert table.schema.names == compact.HIERARCHY + COUNT_COLUMNS
+    assert table.schema.field('roads').type == pa.uint16()
+    assert calls == [(0, 0)]
+
+
+class BoundaryClient:
+    """a boundary level query: codes, WKB geometries and the make_valid repair flag"""
+
+    def __init__(self, geometries, repaired, batch_rows):
+        self.total_rows = len(geometries)
+        self.batch_rows = batch_rows
+        self.table = pa.table({
+            'country_code': [f"C{i}" for i in range(len(geometries))],
+            'country_name': [f"name {i}" for i in range(len(geometries))],
+            geo_ingest.GEOMETRY_COLUMN: pa.array(shapely.to_wkb(geometries), type=pa.binary()),
+            geo_ingest.REPAIRED_COLUMN: pa.array(repaired, type=pa.bool_()),
+        })
+
+    def query(self, sql):
+        return self
+
+    def result(self, page_size=None):
+        return self
+
+    def to_arrow_iterable(self, bqstorage_client=None):
+        return iter(self.table.to_batches(max_chunksize=self.batch_rows))
+
+
+def test_stream_boundary_level_writes_geoparquet(store):
+    geometries = [shapely.box(i, 0, i + 1, 1) for i in range(7)]
+    repaired = [False, True, False, False, True, False, False]
+    client = BoundaryClient(geometries, repaired, batch_rows=3)
+
+    assert geo_ingest.stream_boundary_level(client, 'Country', store, 'v1') == 2
+
+    frame = store.read('Country', 'v1')
+    assert isinstance(frame, gpd.GeoDataFrame)
+    assert list(frame.columns) == ['country_code', 'country_name', 'geometry']
+    assert frame.crs.to_epsg() == 4326
+    assert shapely.equals(frame.geometry.values, np.array(geometries)).all()
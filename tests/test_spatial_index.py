@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import shapely
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import spatial_index  # noqa: E402
+
+MAX_LAT = 85.0511287798
+
+
+def test_whole_world_at_zoom_0():
+    bounds = spatial_index.viewport_bounds(0.0, 0.0, 0, width=256, height=256)
+    assert bounds == pytest.approx((-180.0, -MAX_LAT, 180.0, MAX_LAT))
+
+
+def test_quarter_world_at_zoom_1():
+    bounds = spatial_index.viewport_bounds(0.0, 0.0, 1, width=256, height=256)
+    assert bounds == pytest.approx((-90.0, -66.5132604, 90.0, 66.5132604))
+
+
+def test_off_centre_viewport():
+    # 512 x 256 px at zoom 2 is half the world wide and a quarter of it high
+    minx, miny, maxx, maxy = spatial_index.viewport_bounds(45.0, 0.0, 2, width=512, height=256)
+    assert (minx, maxx) == pytest.approx((-45.0, 135.0))
+    assert (miny, maxy) == pytest.approx((-40.9798981, 40.9798981))
+
+
+def test_clamped_to_the_world():
+    minx, miny, maxx, maxy = spatial_index.viewport_bounds(170.0, 80.0, 1, width=1200, height=500)
+    assert minx >= -180.0 and maxx == 180.0
+    assert maxy == pytest.approx(MAX_LAT)
+
+
+def test_pad_grows_each_side_by_a_screen():
+    padded = spatial_index.viewport_bounds(0.0, 0.0, 3, width=256, height=256, pad=1.0)
+    assert padded == pytest.approx(spatial_index.viewport_bounds(0.0, 0.0, 3, width=768, height=768))
+    assert padded[0] == pytest.approx(-67.5) and padded[2] == pytest.approx(67.5)
+
+
+def test_data_window_contains_the_viewport():
+    for zoom in range(1, 13):
+        view = spatial_index.viewport_bounds(80.0, 22.0, zoom)
+        window = spatial_index.data_window(80.0, 22.0, zoom)
+        assert window[0] <= view[0] and window[1] <= view[1]
+        assert window[2] >= view[2] and window[3] >= view[3]
+
+
+@pytest.fixture
+def grid():
+    # 10 x 10 one-degree cells, row-major from (0, 0)
+    cells = [shapely.box(x, y, x + 1, y + 1) for y in range(10) for x in range(10)]
+    return spatial_index.LevelIndex(cells)
+
+
+def test_query_bbox_hits_the_intersecting_cells(grid):
+    hits = grid.query_bbox(2.5, 3.5, 4.5, 4.5)
+    assert hits.tolist() == [32, 33, 34, 42, 43, 44]
+
+
+def test_query_bbox_outside_is_empty(grid):
+    assert len(grid.query_bbox(20.0, 20.0, 21.0, 21.0)) == 0
+
+
+def test_query_viewport_of_a_known_geometry():
+    # a 1 x 1 degree square at (80, 22), and one far away
+    index = spatial_index.LevelIndex([shapely.box(80.0, 22.0, 81.0, 23.0), shapely.box(-60.0, -30.0, -59.0, -29.0)])
+    assert index.query_bbox(*spatial_index.viewport_bounds(80.5, 22.5, 8)).tolist() == [0]
+    assert index.query_bbox(*spatial_index.viewport_bounds(0.0, 0.0, 1, width=256, height=256)).tolist() == [0, 1]
+    # a viewport next to the square that does not reach it, but its data window does
+    assert index.query_bbox(*spatial_index.viewport_bounds(86.0, 22.5, 8)).tolist() == []
+    assert index.query_bbox(*spatial_index.data_window(86.0, 22.5, 8)).tolist() == [0]
+
+
+def test_lookup_point(grid):
+    assert grid.lookup_point(5.5, 7.5) == 75
+    assert grid.lookup_point(50.0, 50.0) is None
+    assert isinstance(grid.query_bbox(0, 0, 1, 1), np.ndarray)
@@ -0,0 +1,148 @@
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+import tile_proxy  # noqa: E402
+from bench_tile_proxy import fake_upstream, load_all, png  # noqa: E402
+
+
+@pytest.fixture
+def upstream():
+    server, template, counter = fake_upstream(0.05)
+    yield template, counter
+    server.shutdown()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(proxy):
+        server = tile_proxy.serve(proxy, port=0)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_concurrent_viewers_fetch_each_tile_once(tmp_path, upstream, serve):
+    template, counter = upstream
+    proxy = tile_proxy.TileProxy(tile_proxy.TileStore(str(tmp_path / 'tiles.mbtiles')))
+    proxy.register('layer', lambda: template)
+    base = serve(proxy)
+    tiles = list(tile_proxy.tiles_up_to(2))
+
+    load_all(base, 'layer', tiles, viewers=6)
+    assert counter['requests'] == len(tiles)
+    load_all(base, 'layer', tiles, viewers=6)
+    assert counter['requests'] == len(tiles)
+
+    stats = proxy.store.stats()
+    assert stats['tiles'] == len(tiles)
+    assert stats['misses'] >= len(tiles) and stats['hits'] >= 6 * len(tiles)
+
+
+def test_served_tile_is_the_upstream_tile(tmp_path, upstream, serve):
+    template, _ = upstream
+    proxy = tile_proxy.TileProxy(tile_proxy.TileStore(str(tmp_path / 'tiles.mbtiles')))
+    proxy.register('layer', lambda: template)
+    base = serve(proxy)
+    with urllib.request.urlopen(f"{base}/tiles/layer/2/1/3") as response:
+        assert response.read() == png(2, 1, 3)
+        assert response.headers['Content-Type'] == 'image/png'
+    for path, status in [('/tiles/unknown/0/0/0', 404), ('/tiles/layer/1/2/0', 400), ('/other', 404)]:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(base + path)
+        assert e.value.code == status
+
+
+def test_eviction_keeps_the_store_within_budget(tmp_path, upstream):
+    template, _ = upstream
+    max_bytes = 4 * len(png(2, 1, 1))
+    store = tile_proxy.TileStore(str(tmp_path / 'small.mbtiles'), max_bytes=max_bytes)
+    proxy = tile_proxy.TileProxy(store)
+    proxy.register('layer', lambda: template)
+
+    fetched, failed = tile_proxy.prefetch(proxy, 'layer', 2)
+    stats = store.stats()
+    assert (fetched, failed) == (21, 0)
+    assert 0 < stats['tiles'] < 21
+    assert stats['bytes'] <= max_bytes
+    assert stats['evictions'] == 21 - stats['tiles']
+
+
+def test_tile_larger_than_budget_is_not_stored(tmp_path):
+    store = tile_proxy.TileStore(str(tmp_path / 'tiny.mbtiles'), max_bytes=10)
+    assert not store.put('layer', 0, 0, 0, b'x' * 11)
+    assert store.get('layer', 0, 0, 0) is None
+
+
+class ExpiringUpstream:
+    """upstream whose template goes stale: tiles of an invalidated template get a 403"""
+
+    def __init__(self, status=403):
+        self.status = status
+        self.generation = 0
+        self.resolved = 0
+        self.invalidated = 0
+        self.requests = []
+
+    def resolve(self):
+        self.resolved += 1
+        return f"gen{self.generation}/{{z}}/{{x}}/{{y}}"
+
+    def invalidate(self):
+        self.invalidated += 1
+        self.generation += 1
+
+    def fetch(self, url):
+        self.requests.append(url)
+        if url.startswith('gen0/'):
+            raise tile_proxy.UpstreamError(self.status)
+        return b'tile ' + url.encode()
+
+
+def test_4xx_invalidates_and_retries_once(tmp_path):
+    upstream = ExpiringUpstream(403)
+    proxy = tile_proxy.TileProxy(tile_proxy.TileStore(str(tmp_path / 'tiles.mbtiles')), fetch=upstream.fetch)
+    proxy.register('layer', upstream.resolve, upstream.invalidate)
+
+    assert proxy.tile('layer', 1, 0, 1) == b'tile gen1/1/0/1'
+    assert upstream.requests == ['gen0/1/0/1', 'gen1/1/0/1']
+    assert upstream.invalidated == 1
+    # the retried tile is stored; later tiles use the fresh template straight away
+    assert proxy.tile('layer', 1, 0, 1) == b'tile gen1/1/0/1'
+    assert proxy.tile('layer', 1, 1, 1) == b'tile gen1/1/1/1'
+    assert upstream.invalidated == 1 and len(upstream.requests) == 3
+
+
+def test_persistent_4xx_is_not_retried_forever(tmp_path):
+    class Missing(ExpiringUpstream):
+        def fetch(self, url):
+            self.requests.append(url)
+            raise tile_proxy.UpstreamError(404)
+
+    upstream = Missing()
+    proxy = tile_proxy.TileProxy(tile_proxy.TileStore(str(tmp_path / 'tiles.mbtiles')), fetch=upstream.fetch)
+    proxy.register('layer', upstream.resolve, upstream.invalidate)
+    with pytest.raises(tile_proxy.UpstreamError):
+        proxy.tile('layer', 0, 0, 0)
+    assert len(upstream.requests) == 2 and upstream.invalidated == 1
+    assert proxy.store.stats()['errors'] == 1
+
+
+def test_5xx_is_not_retried(tmp_path):
+    upstream = ExpiringUpstream(503)
+    proxy = tile_proxy.TileProxy(tile_proxy.TileStore(str(tmp_path / 'tiles.mbtiles')), fetch=upstream.fetch)
+    proxy.register('layer', upstream.resolve, upstream.invalidate)
+    with pytest.raises(tile_proxy.UpstreamError):
+        proxy.tile('layer', 0, 0, 0)
+    assert upstream.requests == ['gen0/0/0/0'] and upstream.invalidated == 0
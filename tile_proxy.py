@@ -0,0 +1,324 @@
+"""
+Caching XYZ tile proxy for the Earth Engine raster layers.
+
+When enabled, the folium maps on pages 1-4 request tiles from this proxy
+instead of from Earth Engine. Each tile is fetched from upstream once and
+stored in an MBTiles-layout SQLite file (TMS rows, PNG/JPEG blobs) next to
+the result cache. Later
+requests from any viewer are served from that file. A layer is identified by
+a stable id (ee_tiles.layer_id: the serialized expression plus vis params),
+not by its upstream URL. The upstream URL carries a map ID that expires, so the
+URL is resolved again through a callable whenever a tile is missing. When
+the stored tiles pass MAX_BYTES, the least recently served ones are evicted.
+A cache hit stays off the SQLite write lock, as in result_cache: access times
+are only rewritten once stale and hit/miss counts are flushed in batches.
+
+    GET /tiles/<layer>/<z>/<x>/<y>
+
+The proxy runs in a daemon thread of the Streamlit process, like vector_tiles.
+It is off unless GEOAPP_TILE_PROXY=1. Set GEOAPP_TILE_PROXY_URL as well, to an
+address every viewer's browser can reach (not localhost, unless the browser
+runs on the server). When upstream rejects a tile with a 4xx, the layer's
+upstream URL is invalidated and resolved again once, so an expired map ID
+recovers.
+
+`python tile_proxy.py --max-zoom 3` warms zoom levels 0-3 of every dataset over
+the default world extent. The upstream fetch is injectable
+(TileProxy(store, fetch=...)), and any local XYZ server can stand in for Earth
+Engine (see benchmarks/bench_tile_proxy.py).
+"""
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from urllib.parse import quote
+
+import tile_server
+from result_cache import CACHE_DIR
+from sqlite_store import SQLiteStore
+
+ENABLED = os.environ.get('GEOAPP_TILE_PROXY', '0') == '1'
+PROXY_PORT = int(os.environ.get('GEOAPP_TILE_PROXY_PORT', 8766))
+# base URL the browser uses to reach the proxy (set it when behind a reverse proxy)
+PROXY_URL = os.environ.get('GEOAPP_TILE_PROXY_URL', f"http://localhost:{PROXY_PORT}")
+STORE_PATH = os.environ.get('GEOAPP_TILE_STORE', os.path.join(CACHE_DIR, 'tiles.mbtiles'))
+MAX_BYTES = int(os.environ.get('GEOAPP_TILE_STORE_MAX_BYTES', 2 * 2**30))
+FETCH_TIMEOUT = 30
+TILE_PATH = tile_server.tile_path('layer', extension=r'(\.\w+)?')
+
+# MBTiles tiles table, plus the layer column (one file holds every layer) and LRU bookkeeping
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    layer TEXT NOT NULL,
+    zoom_level INTEGER NOT NULL,
+    tile_column INTEGER NOT NULL,
+    tile_row INTEGER NOT NULL,
+    tile_data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (layer, zoom_level, tile_column, tile_row)
+);
+CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO metadata VALUES ('name', 'geoapp tile cache'), ('format', 'png');
+INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0), ('errors', 0);
+"""
+
+
+def tms_row(z, y):
+    """MBTiles stores rows bottom-up"""
+    return 2 ** z - 1 - y
+
+
+def content_type(data):
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+###############################################
+## STORE
+###############################################
+
+class TileStore(SQLiteStore):
+
+    def __init__(self, path=STORE_PATH, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        super().__init__(path, _SCHEMA)
+
+    def get(self, layer, z, x, y):
+        # a hit only writes when the tile's access time is stale; counts are flushed in batches
+        con = self._connect()
+        row = con.execute(
+            'SELECT rowid, tile_data, accessed FROM tiles '
+            'WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (layer, z, x, tms_row(z, y)),
+        ).fetchone()
+        if row is None:
+            self._count(con, 'misses')
+            return None
+        self._touch(con, 'tiles', row[0], row[2])
+        self._count(con, 'hits')
+        return bytes(row[1])
+
+    def has(self, layer, z, x, y):
+        return self._connect().execute(
+            'SELECT 1 FROM tiles WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (layer, z, x, tms_row(z, y)),
+        ).fetchone() is not None
+
+    def put(self, layer, z, x, y, data):
+        if len(data) > self.max_bytes:
+            return False
+        with self._transaction() as con:
+            con.execute(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (layer, z, x, tms_row(z, y), sqlite3.Binary(data), len(data), time.time()),
+            )
+            # least recently served first, until the running total fits the budget
+            self._evict(con, 'tiles', self.max_bytes)
+            self._flush_counts(con)
+        return True
+
+    def error(self):
+        self._bump(self._connect(), 'errors')
+
+    def stats(self):
+        con = self._connect()
+        self._flush_counts(con)
+        stats = dict(con.execute('SELECT name, value FROM stats').fetchall())
+        tiles, size, layers = con.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(DISTINCT layer) FROM tiles'
+        ).fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats.update(tiles=tiles, bytes=size, layers=layers, max_bytes=self.max_bytes,
+                     hit_rate=stats['hits'] / lookups if lookups else 0.0)
+        return stats
+
+
+###############################################
+## PROXY
+###############################################
+
+class UpstreamError(Exception):
+
+    def __init__(self, status, message=''):
+        super().__init__(f"upstream returned {status} {message}".strip())
+        self.status = status
+
+
+def fetch_url(url, timeout=FETCH_TIMEOUT):
+    """tile bytes from an upstream URL"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        raise UpstreamError(e.code, e.reason) from e
+    except (urllib.error.URLError, OSError) as e:
+        raise UpstreamError(502, str(e)) from e
+
+
+class TileProxy:
+
+    def __init__(self, store, fetch=fetch_url):
+        """store: TileStore, fetch: url -> tile bytes (raising UpstreamError)"""
+        self.store = store
+        self.fetch = fetch
+        self._upstreams = {}  # layer id -> (() -> upstream XYZ template, () -> None dropping a stale template)
+        self._inflight = {}  # (layer, z, x, y) -> Future
+        self._lock = threading.Lock()
+
+    def register(self, layer, upstream, invalidate=None):
+        """
+        route a layer through the proxy; `upstream` returns the current upstream URL
+        template ({z}/{x}/{y}), `invalidate` forgets it when upstream rejects it.
+        Returns the template the browser should use.
+        """
+        with self._lock:
+            self._upstreams[layer] = (upstream, invalidate)
+        return tile_url(layer)
+
+    def _fetch_upstream(self, upstream, z, x, y):
+        resolve, invalidate = upstream
+        try:
+            return self.fetch(resolve().format(z=z, x=x, y=y))
+        except UpstreamError as e:
+            # a 4xx usually means the map ID behind the template expired: resolve it again, once
+            if invalidate is None or not 400 <= e.status < 500:
+                raise
+            invalidate()
+            return self.fetch(resolve().format(z=z, x=x, y=y))
+
+    def tile(self, layer, z, x, y):
+        """tile bytes, from the store or fetched once from upstream; None for an unknown layer"""
+        data = self.store.get(layer, z, x, y)
+        if data is not None:
+            return data
+
+        # concurrent requests for the same missing tile share one upstream fetch
+        key = (layer, z, x, y)
+        with self._lock:
+            upstream = self._upstreams.get(layer)
+            if upstream is None:
+                return None
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            data = self._fetch_upstream(upstream, z, x, y)
+            self.store.put(layer, z, x, y, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            self.store.error()
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+def tile_url(layer):
+    """leaflet URL template for a layer served by the proxy"""
+    return f"{PROXY_URL}/tiles/{quote(layer)}/{{z}}/{{x}}/{{y}}"
+
+
+def _tile(proxy):
+
+    def tile(z, x, y, layer):
+        try:
+            return proxy.tile(layer, z, x, y)
+        except UpstreamError as e:
+            raise tile_server.TileError(e.status if 400 <= e.status < 600 else 502) from e
+        except Exception as e:
+            # resolving the upstream URL (Earth Engine) or the store failed
+            raise tile_server.TileError(502) from e
+
+    return tile
+
+
+def serve(proxy, port=PROXY_PORT):
+    """start the proxy in a daemon thread and return the server"""
+    handler = tile_server.handler(TILE_PATH, _tile(proxy), content_type, 'public, max-age=86400')
+    return tile_server.serve(handler, port, 'tile-proxy')
+
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def get_proxy():
+    """the process-wide proxy, serving from its first use"""
+    global _proxy
+    with _proxy_lock:
+        if _proxy is None:
+            _proxy = TileProxy(TileStore())
+            serve(_proxy)
+        return _proxy
+
+
+###############################################
+## PREFETCH
+###############################################
+
+def tiles_up_to(max_zoom, min_zoom=0):
+    for z in range(min_zoom, max_zoom + 1):
+        for x in range(2 ** z):
+            for y in range(2 ** z):
+                yield z, x, y
+
+
+def prefetch(proxy, layer, max_zoom, min_zoom=0, workers=8):
+    """fetch every missing tile of a registered layer up to max_zoom; returns (fetched, failed)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    missing = [t for t in tiles_up_to(max_zoom, min_zoom) if not proxy.store.has(layer, *t)]
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tile-prefetch') as executor:
+        for future in [executor.submit(proxy.tile, layer, *t) for t in missing]:
+            try:
+                future.result()
+            except Exception:
+                failed += 1
+    return len(missing) - failed, failed
+
+
+def main():
+    import argparse
+
+    import ee
+
+    import dataset_registry as registry
+    import ee_tiles
+
+    parser = argparse.ArgumentParser(description='warm the tile store for the default world view of each dataset')
+    parser.add_argument('--max-zoom', type=int, default=3)
+    parser.add_argument('--min-zoom', type=int, default=0)
+    parser.add_argument('--datasets', nargs='+', default=list(registry.DATASETS), choices=list(registry.DATASETS))
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    ee.Initialize()
+    proxy = TileProxy(TileStore())
+    for name in args.datasets:
+        # the same expression and vis params the pages build for the world ROI
+        image = registry.layer(name, False, registry.countries(), ('world',))
+        layer = ee_tiles.register(proxy, image, registry.get(name).vis())
+        fetched, failed = prefetch(proxy, layer, args.max_zoom, args.min_zoom, args.workers)
+        print(f"{name}: {fetched} tiles fetched, {failed} failed")
+    print(proxy.store.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Minimal XYZ tile HTTP server shared by vector_tiles and tile_proxy.
+
+Both run a ThreadingHTTPServer in a daemon thread of the Streamlit process and
+answer GET /tiles/<name parts>/<z>/<x>/<y><extension> with CORS headers; they
+only differ in how a tile is produced and how long browsers may keep it.
+"""
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class TileError(Exception):
+    """raised by a tile callback to answer with an HTTP error status"""
+
+    def __init__(self, status):
+        super().__init__(f"tile request failed with {status}")
+        self.status = status
+
+
+def tile_path(*names, extension=''):
+    """regex for /tiles/<name>/.../<z>/<x>/<y><extension>, one named group per name"""
+    parts = ''.join(f"/(?P<{name}>[^/]+)" for name in names)
+    return re.compile(rf'^/tiles{parts}/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+){extension}$')
+
+
+def handler(pattern, tile, content_type, cache_control):
+    """
+    request handler class: tile(z, x, y, **names) returns the tile bytes, None for
+    404, or raises TileError; content_type(data) names the tile's media type
+    """
+
+    class TileHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            match = pattern.match(self.path.split('?')[0])
+            if not match:
+                self.send_error(404)
+                return
+            z, x, y = int(match['z']), int(match['x']), int(match['y'])
+            if x >= 2 ** z or y >= 2 ** z:
+                self.send_error(400)
+                return
+            names = {k: unquote(v) for k, v in match.groupdict().items() if k not in ('z', 'x', 'y')}
+            try:
+                data = tile(z, x, y, **names)
+            except TileError as e:
+                self.send_error(e.status)
+                return
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type(data))
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TileHandler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # a map view opens many tile connections at once; the default backlog of 5
+    # drops SYNs, which the client retries a second later
+    request_queue_size = 128
+
+
+def serve(handler_class, port, name):
+    """start a server for handler_class in a daemon thread and return it"""
+    server = _Server(('0.0.0.0', port), handler_class)
+    threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+    return server
@@ -0,0 +1,174 @@
+"""
+Quantized TopoJSON for the boundary layers.
+
+GeoJSON ships every coordinate as a full-precision float and every shared
+boundary twice, once per neighbour. Here coordinates are snapped to an integer
+grid, rings are cut into arcs at the points where neighbours change, each arc
+is stored once (neighbours reference it, reversed with ~index) and arc
+coordinates are delta-encoded, so most of them are small integers.
+
+    topo = topology(gdf.geometry.values)
+    text = to_json(with_properties(topo, gdf.drop(columns='geometry')))
+"""
+import gzip
+import json
+
+import numpy as np
+import shapely
+
+QUANTIZATION = 100_000
+OBJECT_NAME = 'layer'
+
+
+###############################################
+## ENCODING
+###############################################
+
+def _quantize(coords, quantization):
+    x0, y0 = coords.min(axis=0) if len(coords) else (0.0, 0.0)
+    x1, y1 = coords.max(axis=0) if len(coords) else (1.0, 1.0)
+    scale = np.array([(x1 - x0) or 1.0, (y1 - y0) or 1.0]) / (quantization - 1)
+    q = np.round((coords - [x0, y0]) / scale).astype(np.int64)
+    return q, {'scale': scale.tolist(), 'translate': [float(x0), float(y0)]}
+
+
+def _open_rings(q, ring_of_point, n_rings):
+    """point ids per ring, closing point and repeated (snapped together) points removed"""
+    keys = q[:, 0] * (q[:, 1].max(initial=0) + 1) + q[:, 1]
+    points, ids = np.unique(keys, return_index=True, return_inverse=True)[1:]
+    ids = ids.ravel()
+    starts = np.searchsorted(ring_of_point, np.arange(n_rings))
+    ends = np.append(starts[1:], len(ids))
+    rings = []
+    for start, end in zip(starts, ends):
+        ring = ids[start:end]
+        ring = ring[np.append(True, ring[1:] != ring[:-1])]
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring = ring[:-1]
+        rings.append(ring)
+    return q[points], rings
+
+
+def _junctions(rings, n_points):
+    """points where the neighbouring point pair differs between rings: arcs start and end there"""
+    rings = [r for r in rings if len(r) >= 3]
+    if not rings:
+        return np.zeros(n_points, dtype=bool)
+    ids = np.concatenate(rings)
+    prev = np.concatenate([np.roll(r, 1) for r in rings])
+    nxt = np.concatenate([np.roll(r, -1) for r in rings])
+    triples = np.unique(np.stack([ids, np.minimum(prev, nxt), np.maximum(prev, nxt)], axis=1), axis=0)
+    return np.bincount(triples[:, 0], minlength=n_points) > 1
+
+
+class _Arcs:
+
+    def __init__(self):
+        self.index = {}
+        self.arcs = []
+
+    def add(self, ids):
+        """index of the arc through ids, ~index when an existing arc runs the other way"""
+        key = ids.tobytes()
+        if key in self.index:
+            return self.index[key]
+        reverse = ids[::-1].tobytes()
+        if reverse in self.index:
+            return ~self.index[reverse]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(ids)
+        return self.index[key]
+
+    def ring(self, ring, is_junction):
+        cuts = np.flatnonzero(is_junction[ring])
+        if len(cuts) == 0:
+            # a ring nobody else shares a stretch with: one closed arc, rotated to a canonical start
+            forward = np.roll(ring, -int(np.argmin(ring)))
+            backward = forward[::-1]
+            backward = np.roll(backward, -int(np.argmin(backward)))
+            key = np.append(backward, backward[0]).tobytes()
+            if key in self.index:
+                return [~self.index[key]]
+            return [self.add(np.append(forward, forward[0]))]
+        ring = np.roll(ring, -int(cuts[0]))
+        cuts = np.append(cuts - cuts[0], len(ring))
+        ring = np.append(ring, ring[0])
+        return [self.add(ring[a:b + 1]) for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+def _delta(points):
+    return np.vstack([points[:1], np.diff(points, axis=0)]).tolist()
+
+
+def topology(geometry, quantization=QUANTIZATION, name=OBJECT_NAME):
+    """
+    TopoJSON Topology dict for an array of (multi)polygons, one geometry object per
+    input row in the same order, without properties (see with_properties)
+    """
+    geometry = np.asarray(geometry, dtype=object)
+    parts, feature_of_part = shapely.get_parts(geometry, return_index=True)
+    rings, part_of_ring = shapely.get_rings(parts, return_index=True)
+    coords, ring_of_point = shapely.get_coordinates(rings, return_index=True)
+
+    q, transform = _quantize(coords, quantization)
+    points, open_rings = _open_rings(q, ring_of_point, len(rings))
+    is_junction = _junctions(open_rings, len(points))
+
+    arcs = _Arcs()
+    polygons = [[] for _ in range(len(parts))]
+    for part, ring in zip(part_of_ring, open_rings):
+        if len(ring) < 3:
+            if not polygons[part]:
+                polygons[part] = None  # exterior collapsed on the grid: drop the whole part
+            continue
+        if polygons[part] is not None:
+            polygons[part].append(arcs.ring(ring, is_junction))
+
+    features = [[] for _ in range(len(geometry))]
+    for feature, polygon in zip(feature_of_part, polygons):
+        if polygon:
+            features[feature].append(polygon)
+    objects = []
+    for polygon_list in features:
+        if not polygon_list:
+            objects.append({'type': None})
+        elif len(polygon_list) == 1:
+            objects.append({'type': 'Polygon', 'arcs': polygon_list[0]})
+        else:
+            objects.append({'type': 'MultiPolygon', 'arcs': polygon_list})
+
+    return {
+        'type': 'Topology',
+        'transform': transform,
+        'objects': {name: {'type': 'GeometryCollection', 'geometries': objects}},
+        'arcs': [_delta(points[ids]) for ids in arcs.arcs],
+    }
+
+
+def with_properties(topo, properties, name=OBJECT_NAME):
+    """shallow copy of a topology with one properties dict per geometry, rows in the same order"""
+    records = json.loads(properties.to_json(orient='records')) if len(properties.columns) else [{}] * len(properties)
+    geometries = [dict(g, properties=p) for g, p in zip(topo['objects'][name]['geometries'], records)]
+    return dict(topo, objects={**topo['objects'], name: {'type': 'GeometryCollection', 'geometries': geometries}})
+
+
+def to_json(topo):
+    return json.dumps(topo, separators=(',', ':'))
+
+
+###############################################
+## PAYLOAD SIZES
+###############################################
+
+def payload_sizes(gdf, quantization=QUANTIZATION):
+    """bytes of the GeoJSON a map would ship for gdf versus its quantized TopoJSON, raw and gzipped"""
+    geojson = gdf.to_json().encode()
+    topojson = to_json(with_properties(topology(gdf.geometry.values, quantization), gdf.drop(columns=gdf.geometry.name))).encode()
+    return {
+        'features': len(gdf),
+        'geojson bytes': len(geojson),
+        'topojson bytes': len(topojson),
+        'geojson gzip bytes': len(gzip.compress(geojson, 6)),
+        'topojson gzip bytes': len(gzip.compress(topojson, 6)),
+        'ratio': len(geojson) / max(len(topojson), 1),
+    }
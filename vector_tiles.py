@@ -0,0 +1,167 @@
+"""
+Embedded Mapbox Vector Tile server for the admin boundary layers.
+
+Layers are registered per (name, version) with their LOD pyramid (see lod.py)
+and per-unit properties (codes, names and a value per topic); the version is
+part of the tile URL, so sessions showing different versions of a layer (e.g.
+classification schemes) get their own tiles, and browsers never keep tiles of a
+version that was replaced. Tiles are cut on
+request from an STRtree over the LOD that fits the tile's zoom, encoded with
+mapbox_vector_tile and kept in a bounded per-tile LRU cache. The server runs in a
+daemon thread of the Streamlit process:
+
+    GET /tiles/<layer>/<version>/<z>/<x>/<y>.pbf
+
+Streamlit does not route this port, so the server is off unless GEOAPP_TILE_URL
+is set to an address where every viewer's browser can reach GEOAPP_TILE_PORT
+(published by the container or routed by a reverse proxy).
+"""
+import collections
+import json
+import os
+import threading
+from urllib.parse import quote
+
+import mapbox_vector_tile
+import numpy as np
+import pandas as pd
+import pyproj
+import shapely
+
+import lod
+import tile_server
+
+TILE_PORT = int(os.environ.get('GEOAPP_TILE_PORT', 8765))
+# base URL every viewer's browser can reach the tile server at; the renderer is off without it
+TILE_URL = os.environ.get('GEOAPP_TILE_URL')
+ENABLED = bool(TILE_URL)
+
+EXTENT = 4096
+BUFFER = 64  # tile units drawn outside the tile so strokes do not show seams
+ORIGIN = 20037508.342789244
+TILE_PATH = tile_server.tile_path('layer', 'version', extension=r'\.pbf')
+
+_to_mercator = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+
+
+def tile_bounds(z, x, y):
+    """web mercator bounds of tile z/x/y"""
+    size = 2 * ORIGIN / 2 ** z
+    minx = -ORIGIN + x * size
+    maxy = ORIGIN - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def to_mercator(geometry):
+    # clamp to the mercator latitude range before projecting
+    geometry = shapely.clip_by_rect(geometry, -180.0, -85.05112878, 180.0, 85.05112878)
+    return shapely.transform(geometry, lambda c: np.column_stack(_to_mercator.transform(c[:, 0], c[:, 1])))
+
+
+def _clean_properties(record):
+    return {k: (v.item() if hasattr(v, 'item') else v) for k, v in record.items() if not pd.isna(v)}
+
+
+class TileLayers:
+
+    def __init__(self, cache_size=4096, max_layers=16):
+        # (name, version) -> ([mercator geometry per LOD], [STRtree per LOD], [properties]), least recently used first
+        self._layers = collections.OrderedDict()
+        self._max_layers = max_layers
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def set_layer(self, name, version, pyramid, properties):
+        """register a layer; `pyramid` is lod.build_pyramid output in EPSG:4326, `properties` a row-aligned DataFrame"""
+        if self.has_layer(name, version):
+            return False
+        projected = [to_mercator(np.asarray(geometry)) for geometry in pyramid]
+        trees = [shapely.STRtree(geometry) for geometry in projected]
+        records = [_clean_properties(r) for r in properties.to_dict('records')]
+        with self._lock:
+            self._layers[(name, version)] = (projected, trees, records)
+            while len(self._layers) > self._max_layers:
+                evicted, _ = self._layers.popitem(last=False)
+                for key in [k for k in self._cache if k[:2] == evicted]:
+                    del self._cache[key]
+        return True
+
+    def has_layer(self, name, version):
+        with self._lock:
+            if (name, version) in self._layers:
+                self._layers.move_to_end((name, version))
+                return True
+            return False
+
+    def tile(self, name, version, z, x, y):
+        """encoded MVT bytes for one tile, or None for an unknown layer version"""
+        with self._lock:
+            if (name, version) not in self._layers:
+                return None
+            projected, trees, records = self._layers[(name, version)]
+            key = (name, version, z, x, y)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = self._encode(name, projected, trees, records, z, x, y)
+
+        with self._lock:
+            if (name, version) not in self._layers:
+                return data  # replaced while encoding; do not cache tiles of an evicted layer
+            self._cache[key] = data
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def _encode(self, name, projected, trees, records, z, x, y):
+        level = min(lod.pick_lod(z), len(projected) - 1)
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        pad = (maxx - minx) * BUFFER / EXTENT
+        hits = trees[level].query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))
+        clipped = shapely.clip_by_rect(projected[level][hits], minx - pad, miny - pad, maxx + pad, maxy + pad)
+
+        features = [
+            {'geometry': geometry, 'properties': records[i]}
+            for i, geometry in zip(hits, clipped)
+            if not geometry.is_empty
+        ]
+        return mapbox_vector_tile.encode(
+            [{'name': name, 'features': features}],
+            default_options={'quantize_bounds': (minx, miny, maxx, maxy), 'extents': EXTENT},
+        )
+
+
+def tile_url(layer, version):
+    """leaflet / mapbox style URL template for one version of a layer"""
+    return f"{TILE_URL}/tiles/{quote(layer, safe='')}/{quote(str(version), safe='')}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+DEFAULT_PALETTE = ['#ffffcc', '#a1dab4', '#41b6c4', '#2c7fb8', '#253494']
+
+
+def choropleth_options(layer, column, vmax, palette=DEFAULT_PALETTE):
+    """Leaflet.VectorGrid options (as JS) colouring `layer` by the `column` feature property"""
+    vmax = float(vmax) if vmax and np.isfinite(vmax) else 1.0
+    return '''{
+        "vectorTileLayerStyles": {
+            %s: function(properties, zoom) {
+                var palette = %s;
+                var v = properties[%s];
+                var i = (v === undefined) ? -1 : Math.min(palette.length - 1, Math.floor(palette.length * v / %s));
+                return {fill: true, weight: 0.5, color: "#555555", fillOpacity: 0.7,
+                        fillColor: i < 0 ? "#cccccc" : palette[i]};
+            }
+        }
+    }''' % (json.dumps(layer), json.dumps(list(palette)), json.dumps(column), json.dumps(vmax))
+
+
+def serve(layers, port=TILE_PORT):
+    """start the tile server in a daemon thread and return it"""
+    # the URL names the layer version, so its tiles never change
+    handler = tile_server.handler(
+        TILE_PATH, lambda z, x, y, layer, version: layers.tile(layer, version, z, x, y),
+        lambda data: 'application/x-protobuf', 'public, max-age=3600, immutable',
+    )
+    return tile_server.serve(handler, port, 'vector-tiles')
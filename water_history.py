@@ -0,0 +1,140 @@
+"""
+Monthly water area time series from JRC Monthly Water History.
+
+Monthly areas come from the persistent store in area_stats. Only the months it
+does not hold yet are computed, with one getInfo call per chunk of
+CHUNK_YEARS whole years that has missing months. The chunks with missing months
+are requested concurrently. All chunks are handed to the caller in
+chronological order, so the chart can grow while later decades are still
+computing. The per-year reduction runs on the monthly values in pandas. A
+different reducer therefore needs no request at all. Chunks split on year
+boundaries, so a year's reduction never spans two chunks.
+
+    for monthly, yearly in water_history.monthly_series(region, '1984-06-01', '2021-09-01', 6, 9, 1000, 'mean'):
+        chart.plotly_chart(px.bar(yearly, x='Year', y='Area (ha)'))
+"""
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import pandas as pd
+
+import area_stats
+
+MONTHLY_HISTORY = 'JRC/GSW1_3/MonthlyHistory'
+CHUNK_YEARS = 8
+MAX_WORKERS = 4
+
+
+def monthly_water(start_date, end_date, start_month, end_month):
+    """water (class 2) masks of the months in the date and calendar month range"""
+    return (
+        ee.ImageCollection(MONTHLY_HISTORY)
+        .filterDate(start_date, end_date)
+        .filter(ee.Filter.calendarRange(start_month, end_month, 'month'))
+        .map(lambda img: img.eq(2).selfMask())
+    )
+
+
+def month_indices(start_date, end_date, start_month, end_month):
+    """system:index ('YYYY_MM') of every month monthly_water selects, whether or not it has an image"""
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    year, month = start.year, start.month
+    if start.day > 1:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    while datetime.date(year, month, 1) < end:
+        if start_month <= month <= end_month:
+            yield f"{year}_{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def areas_request(region, months, scale):
+    """an ee.List of [month, area (ha)] pairs for the months (system:index values) that have an image"""
+
+    def area(img):
+        stats = img.multiply(ee.Image.pixelArea()).divide(1e4).reduceRegion(
+            reducer=ee.Reducer.sum(),
+            geometry=region,
+            scale=scale,
+            maxPixels=1e12,
+            bestEffort=True,
+        )
+        return ee.Feature(None, {'month': img.get('system:index'), 'area': stats.get('water', 0)})
+
+    images = (
+        ee.ImageCollection(MONTHLY_HISTORY)
+        .filter(ee.Filter.inList('system:index', list(months)))
+        .map(lambda img: img.eq(2).selfMask())
+    )
+    return ee.FeatureCollection(images.map(area)).reduceColumns(ee.Reducer.toList(2), ['month', 'area']).get('list')
+
+
+def compute_areas(region, months, scale):
+    """{month: area} for the months, None where Earth Engine has no image"""
+    areas = dict.fromkeys(months)
+    areas.update((month, area) for month, area in areas_request(region, months, scale).getInfo())
+    return areas
+
+
+def year_chunks(start_date, end_date, chunk_years=CHUNK_YEARS):
+    """[start, end) date pairs covering the range, split on year boundaries"""
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    for year in range(start.year, end.year + 1, chunk_years):
+        low = max(start, datetime.date(year, 1, 1))
+        high = min(end, datetime.date(year + chunk_years, 1, 1))
+        if low < high:
+            yield low.isoformat(), high.isoformat()
+
+
+def _frames(areas, reducer):
+    monthly = pd.DataFrame(
+        sorted((month, area) for month, area in areas.items() if area is not None),
+        columns=['Date', 'Area (ha)'],
+    )
+    monthly.insert(1, 'Year', monthly['Date'].str[:4])
+    result = monthly.groupby('Year')['Area (ha)'].agg(reducer)
+    yearly = pd.DataFrame({'Year': result.index, 'Area (ha)': result.values})
+    return monthly, yearly
+
+
+def monthly_series(region, start_date, end_date, start_month, end_month, scale, reducer,
+                   chunk_years=CHUNK_YEARS, max_workers=MAX_WORKERS, store=None):
+    """
+    yield (monthly, yearly) DataFrames covering the range so far, one chunk of
+    years at a time: monthly has Date, Year and Area (ha), yearly has Year and
+    the Area (ha) reduced with `reducer` (sum, mean, min or max)
+    """
+    store = store if store is not None else area_stats.get_store()
+    roi = area_stats.roi_hash(region)
+    months = list(month_indices(start_date, end_date, start_month, end_month))
+    # 'YYYY_MM' -> 'YYYY-MM-01' compares with the chunks' ISO dates
+    chunks = [
+        [m for m in months if s <= f"{m[:4]}-{m[5:]}-01" < e]
+        for s, e in year_chunks(start_date, end_date, chunk_years)
+    ]
+    chunks = [chunk for chunk in chunks if chunk]
+    if not chunks:
+        return
+    stored = store.monthly(MONTHLY_HISTORY, roi, scale, months)
+
+    def fetch(missing):
+        areas = compute_areas(region, missing, scale)
+        store.put_monthly(MONTHLY_HISTORY, roi, scale, areas)
+        return areas
+
+    monthly, yearly = [], []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='water-history') as executor:
+        pending = []
+        for chunk in chunks:
+            missing = [m for m in chunk if m not in stored]
+            pending.append((chunk, executor.submit(fetch, missing) if missing else None))
+        for chunk, future in pending:
+            areas = {m: stored[m] for m in chunk if m in stored}
+            if future is not None:
+                areas.update(future.result())
+            chunk_monthly, chunk_yearly = _frames(areas, reducer)
+            monthly.append(chunk_monthly)
+            yearly.append(chunk_yearly)
+            yield pd.concat(monthly, ignore_index=True), pd.concat(yearly, ignore_index=True)